@@ -0,0 +1,200 @@
+# booking_api_fastapi/app/candidates.py
+"""
+Candidatos para reasignar turnos (ej: staff enfermo): qué staff activo puede tomar
+cada turno, ordenado por qué tan bien le encaja.
+
+- `load_calendars` trae en UNA query los horarios, blackouts, reservas confirmadas
+  y holds vigentes de todo el staff activo del tenant alrededor de los turnos.
+- `evaluate` / `rank_candidates` trabajan en memoria, en minutos del día local de
+  cada candidato (`LocalDay`), igual que el cálculo de horarios.
+- `suggest_assignments` reparte varios turnos del día sin que dos sugerencias
+  choquen entre sí: el resultado se puede mandar tal cual a PATCH /admin/appointments.
+
+Orden: primero los disponibles, y entre ellos el que deja menos hueco suelto antes y
+después del turno (no rompe bloques libres largos de otros); a igual hueco, el que
+tiene menos minutos reservados ese día.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime, time, timedelta
+from typing import Iterable
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config import APP_TIMEZONE
+from app.utils.time import local_day, utc_to_local
+
+Busy = tuple[str, datetime, datetime]   # (tipo, desde, hasta): appointment / blackout / hold
+
+
+@dataclass
+class StaffCalendar:
+    id: int
+    full_name: str
+    timezone: str
+    schedules: list[tuple[int, time, time]] = field(default_factory=list)   # (día 0=domingo, desde, hasta)
+    busy: list[Busy] = field(default_factory=list)
+
+
+def load_calendars(
+    db: Session,
+    tenant_id: int,
+    lo: datetime,
+    hi: datetime,
+    exclude_appointments: Iterable[int] = (),
+) -> dict[int, StaffCalendar]:
+    """
+    Staff activo del tenant con sus horarios y lo que tiene ocupado en [lo, hi).
+    Las reservas de `exclude_appointments` (las que se están reasignando) no cuentan.
+    """
+    rows = db.execute(text("""
+        WITH st AS (
+            SELECT id, full_name, timezone
+            FROM staff
+            WHERE tenant_id = :tenant AND active = true
+        )
+        SELECT 'staff' AS kind, st.id AS staff_id, st.full_name, st.timezone,
+               NULL::smallint AS day_of_week, NULL::time AS start_time, NULL::time AS end_time,
+               NULL::timestamptz AS starts_at, NULL::timestamptz AS ends_at
+        FROM st
+        UNION ALL
+        SELECT 'schedule', s.staff_id, NULL, NULL, s.day_of_week, s.start_time, s.end_time, NULL, NULL
+        FROM staff_schedules s
+        JOIN st ON st.id = s.staff_id
+        UNION ALL
+        SELECT 'appointment', a.staff_id, NULL, NULL, NULL, NULL, NULL, a.starts_at, a.ends_at
+        FROM appointments a
+        JOIN st ON st.id = a.staff_id
+        WHERE a.tenant_id = :tenant
+          AND a.status = 'confirmed'
+          AND a.starts_at < :hi
+          AND a.ends_at   > :lo
+          AND a.id <> ALL(:exclude)
+        UNION ALL
+        SELECT 'blackout', b.staff_id, NULL, NULL, NULL, NULL, NULL, b.starts_at, b.ends_at
+        FROM blackouts b
+        JOIN st ON st.id = b.staff_id
+        WHERE b.tenant_id = :tenant
+          AND b.starts_at < :hi
+          AND b.ends_at   > :lo
+        UNION ALL
+        SELECT 'hold', h.staff_id, NULL, NULL, NULL, NULL, NULL, h.starts_at, h.ends_at
+        FROM slot_holds h
+        JOIN st ON st.id = h.staff_id
+        WHERE h.expires_at > now()
+          AND h.starts_at < :hi
+          AND h.ends_at   > :lo
+    """), {"tenant": tenant_id, "lo": lo, "hi": hi, "exclude": list(exclude_appointments)}).mappings().all()
+
+    cals: dict[int, StaffCalendar] = {}
+    for r in rows:                      # las filas 'staff' no vienen necesariamente primero
+        if r["kind"] == "staff":
+            cals[r["staff_id"]] = StaffCalendar(r["staff_id"], r["full_name"], r["timezone"] or APP_TIMEZONE)
+    for r in rows:
+        cal = cals[r["staff_id"]]
+        if r["kind"] == "schedule":
+            cal.schedules.append((r["day_of_week"], r["start_time"], r["end_time"]))
+        elif r["kind"] != "staff":
+            cal.busy.append((r["kind"], r["starts_at"], r["ends_at"]))
+    return cals
+
+
+def evaluate(cal: StaffCalendar, start: datetime, end: datetime) -> dict:
+    """Si `cal` puede tomar [start, end) y cuánto hueco le deja (todo en minutos de su día local)."""
+    ld = local_day(cal.timezone, utc_to_local(start, cal.timezone).date())
+    s, e = ld.span(start, end)
+    dow = (ld.day.weekday() + 1) % 7          # 0=domingo, como staff_schedules
+
+    block = None
+    for d, t0, t1 in cal.schedules:
+        if d != dow:
+            continue
+        b0 = ld.wall_to_minute(t0.hour * 60 + t0.minute)
+        b1 = ld.wall_to_minute(t1.hour * 60 + t1.minute)
+        if b0 <= s and e <= b1:
+            block = (b0, b1)
+            break
+
+    day_busy = []
+    for kind, bs, be in cal.busy:
+        m0, m1 = ld.span(bs, be)
+        if m0 < ld.minutes and m1 > 0:
+            day_busy.append((kind, m0, m1))
+
+    reasons = [] if block else ["off_schedule"]
+    reasons += sorted({kind for kind, m0, m1 in day_busy if m0 < e and s < m1})
+    out = {
+        "staff_id": cal.id,
+        "staff_name": cal.full_name,
+        "available": not reasons,
+        "reasons": reasons,
+        "start_local": ld.label(s),
+        "gap_before_min": None,
+        "gap_after_min": None,
+        "booked_minutes": sum(
+            min(m1, ld.minutes) - max(m0, 0) for kind, m0, m1 in day_busy if kind == "appointment"
+        ),
+    }
+    if block:
+        out["gap_before_min"] = s - max([block[0], *(m1 for _, _, m1 in day_busy if m1 <= s)])
+        out["gap_after_min"] = min([block[1], *(m0 for _, m0, _ in day_busy if m0 >= e)]) - e
+    return out
+
+
+def _fit_key(c: dict):
+    if c["available"]:
+        return (0, c["gap_before_min"] + c["gap_after_min"], c["booked_minutes"], c["staff_name"])
+    return (1, len(c["reasons"]), c["booked_minutes"], c["staff_name"])
+
+
+def rank_candidates(
+    cals: dict[int, StaffCalendar],
+    start: datetime,
+    end: datetime,
+    exclude_staff: Iterable[int] = (),
+) -> list[dict]:
+    skip = set(exclude_staff)
+    return sorted(
+        (evaluate(cal, start, end) for sid, cal in cals.items() if sid not in skip),
+        key=_fit_key,
+    )
+
+
+def suggest_assignments(
+    cals: dict[int, StaffCalendar],
+    appointments: list[dict],
+    exclude_staff: Iterable[int] = (),
+) -> list[dict]:
+    """
+    Candidatos de cada turno (`id`, `starts_at`, `ends_at`) y un staff sugerido.
+    Se recorren por hora de inicio y cada sugerencia ocupa al staff elegido para los
+    siguientes, así las sugerencias no se pisan entre sí. `cals` no se modifica.
+    """
+    skip = set(exclude_staff)
+    taken: dict[int, list[Busy]] = {}
+    out = []
+    for appt in sorted(appointments, key=lambda a: (a["starts_at"], a["id"])):
+        start, end = appt["starts_at"], appt["ends_at"]
+        ranked = []
+        for sid, cal in cals.items():
+            if sid in skip:
+                continue
+            if sid in taken:
+                cal = StaffCalendar(cal.id, cal.full_name, cal.timezone, cal.schedules, cal.busy + taken[sid])
+            ranked.append(evaluate(cal, start, end))
+        ranked.sort(key=_fit_key)
+        best = ranked[0]["staff_id"] if ranked and ranked[0]["available"] else None
+        if best is not None:
+            taken.setdefault(best, []).append(("appointment", start, end))
+        out.append({"appointment": appt, "suggested_staff_id": best, "candidates": ranked})
+    return out
+
+
+def window(appointments: list[dict]) -> tuple[datetime, datetime]:
+    """Rango para load_calendars: un día de margen cubre el día local de cualquier zona."""
+    return (
+        min(a["starts_at"] for a in appointments) - timedelta(days=1),
+        max(a["ends_at"] for a in appointments) + timedelta(days=1),
+    )
@@ -0,0 +1,111 @@
+# booking_api_fastapi/app/compression.py
+"""
+Compresión de respuestas (middleware ASGI puro).
+
+- brotli si el cliente lo acepta y está instalado (opcional: `pip install brotli`);
+  si no, gzip (stdlib). Sin `Accept-Encoding` compatible la respuesta sale igual.
+- Sólo tipos de texto (JSON, HTML, texto de /metrics, ...) y de al menos
+  COMPRESSION_MIN_BYTES: para respuestas chicas el costo de CPU no se paga.
+- Respuestas de un solo bloque (lo normal acá) se comprimen enteras y llevan
+  Content-Length; las que vienen en varios bloques se comprimen al vuelo.
+"""
+from __future__ import annotations
+
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import BROTLI_QUALITY, COMPRESSION_MIN_BYTES, GZIP_LEVEL
+
+try:
+    import brotli
+except ImportError:  # opcional
+    brotli = None
+
+COMPRESSIBLE = ("text/", "application/json", "application/javascript", "application/xml", "image/svg+xml")
+
+
+def _encoding(scope: Scope) -> str | None:
+    accept = Headers(scope=scope).get("accept-encoding", "")
+    offered = {p.split(";")[0].strip().lower() for p in accept.split(",")}
+    if brotli is not None and "br" in offered:
+        return "br"
+    if "gzip" in offered:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str) -> None:
+        if encoding == "br":
+            self._c = brotli.Compressor(quality=BROTLI_QUALITY)
+            self.compress, self.flush, self.finish = self._c.process, self._c.flush, self._c.finish
+        else:
+            self._c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)   # 31 = formato gzip
+            self.compress = self._c.compress
+            self.flush = lambda: self._c.flush(zlib.Z_SYNC_FLUSH)
+            self.finish = self._c.flush
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_BYTES) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        encoding = _encoding(scope) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Message | None = None
+        compressor: _Compressor | None = None
+        passthrough = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message                     # se manda con el primer bloque del body
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+            if passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+
+            if compressor is None:
+                headers = MutableHeaders(raw=start["headers"])
+                content_type = headers.get("content-type", "")
+                if ("content-encoding" in headers
+                        or not content_type.startswith(COMPRESSIBLE)
+                        or not more and len(body) < self.minimum_size):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+
+                compressor = _Compressor(encoding)
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if more:
+                    del headers["Content-Length"]
+                else:
+                    body = compressor.compress(body) + compressor.finish()
+                    headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send(start)
+
+            if more:
+                chunk = compressor.compress(body) + compressor.flush()
+            else:
+                chunk = compressor.compress(body) + compressor.finish()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more})
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,8 +1,51 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 APP_TIMEZONE = os.getenv("APP_TIMEZONE", "America/Asuncion")
-DEFAULT_BUFFER_MIN = int(os.getenv("DEFAULT_BUFFER_MIN", "10"))
+SLOT_HOLD_TTL_SEC = int(os.getenv("SLOT_HOLD_TTL_SEC", "300"))
+IDEMPOTENCY_TTL_SEC = int(os.getenv("IDEMPOTENCY_TTL_SEC", "86400"))
+FREE_SLOTS_HORIZON_DAYS = int(os.getenv("FREE_SLOTS_HORIZON_DAYS", "60"))
+
+# Instrumentación SQL (ver app/db.py)
+DEBUG = os.getenv("DEBUG", "").lower() in ("1", "true", "yes")
+SQL_SLOW_MS = float(os.getenv("SQL_SLOW_MS", "200"))
+SQL_REPEAT_WARN = int(os.getenv("SQL_REPEAT_WARN", "10"))
+
+# Métricas (ver app/metrics.py). Con varios workers: directorio compartido, vacío al arrancar
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR", "")
+
+# Profiling bajo demanda (ver app/profiling.py)
+# apagado por defecto: se prende en el deploy donde se quiera perfilar
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "profiles"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))  # los más viejos se borran
+
+# Arranque (ver app/main.py)
+# false: el esquema lo maneja el deploy con `python -m app.schema`
+AUTO_CREATE_SCHEMA = os.getenv("AUTO_CREATE_SCHEMA", "true").lower() in ("1", "true", "yes")
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", "2"))  # conexiones que se abren antes de estar "ready"
+
+# Multi-tenant (ver app/tenancy.py). Con MULTI_TENANT=false todo va al tenant por defecto.
+MULTI_TENANT = os.getenv("MULTI_TENANT", "false").lower() in ("1", "true", "yes")
+DEFAULT_TENANT_ID = int(os.getenv("DEFAULT_TENANT_ID", "1"))
+TENANT_HEADER = os.getenv("TENANT_HEADER", "X-Tenant")
+TENANT_BASE_DOMAIN = os.getenv("TENANT_BASE_DOMAIN", "")  # ej: reservas.example.com → {slug}.reservas.example.com
+# sesiones de DB simultáneas por tenant y proceso (dejarlo por debajo del pool: 5 + 10 de overflow)
+TENANT_DB_MAX_CONNECTIONS = int(os.getenv("TENANT_DB_MAX_CONNECTIONS", "4"))
+TENANT_DB_WAIT_SEC = float(os.getenv("TENANT_DB_WAIT_SEC", "2"))
+# caches por tenant (respuestas ya serializadas, con tope de memoria). Son por proceso: en
+# otros workers un dato viejo dura hasta el TTL. Por defecto sólo con MULTI_TENANT; 0 = apagada.
+CATALOG_CACHE_TTL_SEC = float(os.getenv("CATALOG_CACHE_TTL_SEC", "60" if MULTI_TENANT else "0"))
+AVAILABILITY_CACHE_TTL_SEC = float(os.getenv("AVAILABILITY_CACHE_TTL_SEC", "5" if MULTI_TENANT else "0"))
+TENANT_CACHE_MAX_BYTES = int(os.getenv("TENANT_CACHE_MAX_BYTES", str(1 << 20)))   # por tenant y cache
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(32 << 20)))                # por cache, todos los tenants
+
+# Compresión de respuestas (ver app/compression.py). brotli es opcional: `pip install brotli`.
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() in ("1", "true", "yes")
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))  # más chicas salen sin comprimir
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))          # 1–9
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))  # 0–11; 4 ≈ costo de gzip 5 con mejor ratio
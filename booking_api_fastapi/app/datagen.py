@@ -0,0 +1,186 @@
+# booking_api_fastapi/app/datagen.py
+"""
+Generador de datos sintéticos a escala de producción (para medir índices, caché, etc.).
+
+    python -m app.datagen --staff 50 --years 3 --per-day 8 --blackouts 12
+    python -m app.datagen --staff 200 --years 5 --truncate --free-slots
+    python -m app.datagen --tenant 2 --staff 30        # datos de otro salón
+
+- Catálogo y horarios: upserts en lote de app/seed.py (idempotente).
+- Blackouts y reservas: COPY ... FROM STDIN en bloques, sin ORM.
+Las reservas usan las columnas de la tabla real (customer_name, price, ...),
+igual que las consultas SQL de /bookings y /admin.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import random
+import time as clock
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config import DEFAULT_TENANT_ID
+from app.seed import ensure_unique_indexes, upsert_schedules, upsert_services, upsert_staff
+from app.utils.time import local_to_utc
+
+COPY_CHUNK = 50_000
+WORK_START = time(9, 0)
+WORK_END = time(18, 0)
+STAFF_TZ = "America/Asuncion"   # zona del staff generado; los horarios son hora de reloj ahí
+
+SERVICES = [
+    ("Sintético", f"Servicio {dur} min", None, 100_000 + dur * 1_000, dur)
+    for dur in (30, 45, 60, 90, 120, 150)
+]
+STATUSES = ["confirmed"] * 17 + ["cancelled"] * 3   # ~15% canceladas
+
+
+def _copy(db: Session, table: str, columns: list[str], rows) -> int:
+    """COPY en bloques de COPY_CHUNK filas dentro de la transacción de la sesión."""
+    cursor = db.connection().connection.cursor()
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    total = 0
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow(row)
+        total += 1
+        if total % COPY_CHUNK == 0:
+            buf.seek(0)
+            cursor.copy_expert(sql, buf)
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        buf.seek(0)
+        cursor.copy_expert(sql, buf)
+    return total
+
+
+def _utc(wall: datetime) -> str:
+    # hora de reloj del staff → instante con offset: COPY no depende del TimeZone de la sesión
+    return local_to_utc(wall, STAFF_TZ).isoformat(sep=" ")
+
+
+def _appointments(rnd: random.Random, tenant_id: int, staff_ids, services, first: date, last: date,
+                  per_day: int):
+    """Turnos sin solaparse por staff, de lunes a sábado dentro de WORK_START–WORK_END."""
+    day = first
+    while day <= last:
+        if day.weekday() != 6:  # domingo cerrado
+            for staff_id in staff_ids:
+                cur = datetime.combine(day, WORK_START)
+                end = datetime.combine(day, WORK_END if day.weekday() != 5 else time(13, 0))
+                for _ in range(per_day):
+                    cur += timedelta(minutes=rnd.choice((0, 0, 15, 30, 60)))
+                    svc_id, dur, price = rnd.choice(services)
+                    ends = cur + timedelta(minutes=dur)
+                    if ends > end:
+                        break
+                    yield (
+                        tenant_id, svc_id, staff_id, f"Cliente {rnd.randrange(1_000_000)}", "",
+                        _utc(cur), _utc(ends), price, rnd.choice(STATUSES),
+                    )
+                    cur = ends
+        day += timedelta(days=1)
+
+
+def _blackouts(rnd: random.Random, tenant_id: int, staff_ids, first: date, last: date, per_staff: int):
+    span = (last - first).days
+    for staff_id in staff_ids:
+        for _ in range(per_staff):
+            start = datetime.combine(first + timedelta(days=rnd.randrange(span + 1)), time(rnd.choice((9, 12, 14))))
+            hours = rnd.choice((2, 4, 24, 72))
+            yield (tenant_id, staff_id, "Sintético", _utc(start), _utc(start + timedelta(hours=hours)))
+
+
+def generate(db: Session, args) -> None:
+    rnd = random.Random(args.seed)
+    today = date.today()
+    first = today - timedelta(days=int(365 * args.years))
+    last = today + timedelta(days=args.future_days)
+    tenant = args.tenant
+
+    if args.truncate:
+        db.execute(text("""
+            TRUNCATE appointments, blackouts, free_slots, free_slot_days, slot_holds RESTART IDENTITY
+        """))
+
+    t0 = clock.perf_counter()
+    ensure_unique_indexes(db)
+    upsert_services(db, [
+        {"tenant_id": tenant, "category": c, "name": n, "description": d, "price": p, "duration_minutes": m}
+        for c, n, d, p, m in SERVICES
+    ])
+    services = db.execute(text("""
+        SELECT id, duration_minutes, price FROM services
+        WHERE tenant_id = :tenant AND category = :cat ORDER BY id
+    """), {"tenant": tenant, "cat": SERVICES[0][0]}).all()
+
+    staff_ids = list(upsert_staff(db, [
+        {"tenant_id": tenant, "full_name": f"Staff sintético {i:04d}", "phone": None, "active": True,
+         "timezone": STAFF_TZ}
+        for i in range(1, args.staff + 1)
+    ]).values())
+    upsert_schedules(db, [
+        {"tenant_id": tenant, "staff_id": sid, "day_of_week": dow, "start_time": WORK_START,
+         "end_time": WORK_END if dow != 6 else time(13, 0), "break_minutes": 60 if dow != 6 else 0}
+        for sid in staff_ids for dow in range(1, 7)
+    ])
+    print(f"catálogo: {len(services)} servicios, {len(staff_ids)} staff ({clock.perf_counter() - t0:.1f}s)")
+
+    t0 = clock.perf_counter()
+    n = _copy(db, "blackouts", ["tenant_id", "staff_id", "reason", "starts_at", "ends_at"],
+              _blackouts(rnd, tenant, staff_ids, first, last, args.blackouts))
+    print(f"blackouts: {n} ({clock.perf_counter() - t0:.1f}s)")
+
+    t0 = clock.perf_counter()
+    n = _copy(
+        db, "appointments",
+        ["tenant_id", "service_id", "staff_id", "customer_name", "customer_phone", "starts_at", "ends_at", "price", "status"],
+        _appointments(rnd, tenant, staff_ids, services, first, last, args.per_day),
+    )
+    print(f"appointments: {n} ({clock.perf_counter() - t0:.1f}s)")
+
+    if args.free_slots:
+        from app.free_slots import extend_horizon
+        t0 = clock.perf_counter()
+        n = extend_horizon(db)
+        print(f"free_slots: {n} (staff, día) ({clock.perf_counter() - t0:.1f}s)")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Genera staff, horarios, blackouts y años de reservas")
+    ap.add_argument("--staff", type=int, default=20)
+    ap.add_argument("--years", type=float, default=2, help="años de historia hacia atrás")
+    ap.add_argument("--future-days", type=int, default=60, help="días de reservas hacia adelante")
+    ap.add_argument("--per-day", type=int, default=6, help="máximo de turnos por staff y día")
+    ap.add_argument("--blackouts", type=int, default=10, help="blackouts por staff")
+    ap.add_argument("--tenant", type=int, default=DEFAULT_TENANT_ID, help="tenant_id del salón")
+    ap.add_argument("--seed", type=int, default=42, help="semilla del random (reproducible)")
+    ap.add_argument("--truncate", action="store_true", help="vaciar reservas/blackouts antes (de todos los salones)")
+    ap.add_argument("--free-slots", action="store_true", help="materializar free_slots al final")
+    args = ap.parse_args()
+
+    from app.db import SessionLocal, require_engine
+
+    require_engine()
+    db = SessionLocal()
+    try:
+        generate(db, args)
+        db.commit()
+        db.execute(text("ANALYZE services, staff, staff_schedules, blackouts, appointments"))
+        db.commit()
+        print("✅ Datos sintéticos listos.")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,92 @@
+import logging
 import os
-from sqlalchemy import create_engine
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from sqlalchemy import create_engine, event
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from dotenv import load_dotenv
 load_dotenv()
 
+from app.config import SQL_REPEAT_WARN, SQL_SLOW_MS
+
 Base = declarative_base()  # ✅ esto faltaba
 
 DATABASE_URL = os.getenv("DATABASE_URL") or os.getenv("DATABASE_URL")
 if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-if not DATABASE_URL:
-    raise RuntimeError("DATABASE_URL no está definido")
-
+# Sin DATABASE_URL el módulo igual se importa (tests, benchmarks, CLI --help);
+# falla recién al pedir una sesión. create_engine() no abre conexiones.
 engine = create_engine(
     DATABASE_URL,
     pool_pre_ping=True,
     pool_recycle=300,
-)
+) if DATABASE_URL else None
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
\ No newline at end of file
+def require_engine() -> Engine:
+    if engine is None:
+        raise RuntimeError("DATABASE_URL no está definido")
+    return engine
+
+# ---------- Instrumentación SQL por request ----------
+log = logging.getLogger("app.sql")
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    total_ms: float = 0.0
+    shapes: Counter = field(default_factory=Counter)
+    warned: set = field(default_factory=set)
+
+# La setea el middleware al inicio de cada request (ver app/metrics.py).
+# Es mutable a propósito: los endpoints sync corren en otro hilo con una copia del contexto.
+query_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+_WS = re.compile(r"\s+")
+
+def _shape(statement: str) -> str:
+    # Los valores ya van como parámetros; alcanza con normalizar espacios
+    return _WS.sub(" ", statement).strip()
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+
+    if elapsed_ms >= SQL_SLOW_MS:
+        log.warning("SQL lenta (%.1f ms): %s | params=%.500r", elapsed_ms, _shape(statement), parameters)
+
+    stats = query_stats.get()
+    if stats is None:
+        return
+    stats.count += 1
+    stats.total_ms += elapsed_ms
+
+    shape = _shape(statement)
+    stats.shapes[shape] += 1
+    if stats.shapes[shape] > SQL_REPEAT_WARN and shape not in stats.warned:
+        stats.warned.add(shape)
+        log.warning("Posible N+1: la misma query se repitió más de %d veces en el request: %.300s",
+                    SQL_REPEAT_WARN, shape)
+
+async def get_db():
+    require_engine()
+    from app.tenancy import session_slot  # acá y no arriba: tenancy → metrics → db
+
+    # Cupo de sesiones por tenant: se espera en el event loop, sin tomar un hilo
+    async with session_slot():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            await run_in_threadpool(db.close)  # devuelve la conexión al pool (ROLLBACK)
\ No newline at end of file
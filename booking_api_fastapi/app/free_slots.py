@@ -0,0 +1,304 @@
+# booking_api_fastapi/app/free_slots.py
+"""
+Tabla materializada de tramos libres por (staff, día) para el horizonte de reservas.
+
+- `free_slots` guarda los tramos libres [starts_at, ends_at) como instantes
+  (timestamptz); `day` es el día local en la zona del staff (`staff.timezone`).
+  Son independientes del servicio: los horarios de un servicio salen de ver qué
+  puntos de la grilla entran en algún tramo.
+- Los cálculos van en minutos enteros del día local (`LocalDay` de app/utils/time.py),
+  así los días con cambio de horario (23 o 25 horas) salen bien sin tocar tzinfo.
+- `free_slot_days` marca qué (staff, día) están materializados; un día sin
+  tramos (completo) igual tiene su fila ahí.
+
+Se refresca sólo para los (staff, día) afectados cuando cambia una reserva.
+El job nocturno (`python -m app.free_slots`) extiende el horizonte y borra días pasados.
+Los blackouts y horarios no se cargan por la API: después de cambiarlos hay que
+refrescar el rango (POST /admin/free-slots/refresh); hasta entonces free_slots no
+los ve. El job nocturno no los detecta (sólo agrega días que falten).
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterable
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config import APP_TIMEZONE, FREE_SLOTS_HORIZON_DAYS
+from app.tenancy import invalidate_availability
+from app.utils.sql import values_clause
+from app.utils.time import LocalDay, local_day, local_to_utc, zone
+
+# Ventana laboral fija: 08:30–18:30 de reloj del staff (el último turno puede arrancar 18:30)
+WORK_START = time(8, 30)
+WORK_END = time(18, 30)
+GRID_MINUTES = 15
+
+Run = tuple[int, int]          # [desde, hasta) en minutos del día local (ver LocalDay)
+StaffDay = tuple[int, date]
+
+
+def staff_timezones(db: Session, staff_ids: Iterable[int], tenant_id: int | None = None) -> dict[int, str]:
+    """
+    Zona de cada staff (APP_TIMEZONE si no tiene) en una sola query. Los que no
+    existen (o no son de `tenant_id`, si se pasa) no vienen: sirve para validarlos.
+    """
+    ids = sorted(set(staff_ids))
+    if not ids:
+        return {}
+    rows = db.execute(text("""
+        SELECT id, timezone
+        FROM staff
+        WHERE id = ANY(:ids)
+          AND (CAST(:tenant AS integer) IS NULL OR tenant_id = :tenant)
+    """), {"ids": ids, "tenant": tenant_id}).all()
+    return {sid: tz or APP_TIMEZONE for sid, tz in rows}
+
+
+def work_window(ld: LocalDay) -> Run:
+    return (
+        ld.wall_to_minute(WORK_START.hour * 60 + WORK_START.minute),
+        ld.wall_to_minute(WORK_END.hour * 60 + WORK_END.minute),
+    )
+
+
+def affected_days(staff_id: int, start: datetime, end: datetime, tz_name: str) -> list[StaffDay]:
+    """(staff, día local del staff) que toca un turno [start, end). Naive = hora de reloj del staff."""
+    tz = zone(tz_name)
+    first = local_to_utc(start, tz_name).astimezone(tz).date()
+    last = local_to_utc(end, tz_name).astimezone(tz).date()
+    return [(staff_id, first + timedelta(days=i)) for i in range((last - first).days + 1)]
+
+
+def free_runs(ld: LocalDay, busy: Iterable[Run]) -> list[Run]:
+    """
+    Complemento de `busy` desde el inicio de la ventana hasta el fin del día local.
+    Sólo cuentan los ocupados que pisan la ventana laboral, igual que el cálculo
+    en vivo: un turno puede arrancar 18:30 y terminar después.
+    """
+    work_start, work_end = work_window(ld)
+    cap = ld.minutes
+    runs: list[Run] = []
+    cur = work_start
+    for s, e in sorted(b for b in busy if b[0] < work_end and b[1] > work_start):
+        if s > cur:
+            runs.append((cur, min(s, cap)))
+        cur = max(cur, e)
+        if cur >= cap:
+            break
+    if cur < cap:
+        runs.append((cur, cap))
+    return runs
+
+
+def grid_slots(
+    ld: LocalDay,
+    runs: list[Run],
+    taken: list[Run],
+    duration_minutes: int,
+    now: datetime | None = None,
+) -> list[str]:
+    """
+    Horarios 'HH:MM' de la grilla (cada GRID_MINUTES, de WORK_START a WORK_END inclusive)
+    donde el servicio entra entero en un tramo libre y no pisa nada de `taken` (holds).
+    Si `ld` es hoy, arranca desde el próximo múltiplo de la grilla.
+    Todo en minutos enteros; la hora de reloj se arma sólo para los que entran.
+    `runs` viene ordenado y sin solaparse (free_runs / load_free_runs).
+    """
+    cur, work_end = work_window(ld)
+    now_min = ld.minute(now or datetime.now(timezone.utc))
+    if 0 <= now_min < ld.minutes:
+        cur = max(cur, now_min + -now_min % GRID_MINUTES)
+
+    slots: list[str] = []
+    i, n = 0, len(runs)
+    while cur <= work_end:                                 # <= 18:30
+        while i < n and runs[i][1] <= cur:                 # tramos que ya quedaron atrás
+            i += 1
+        if i == n:
+            break
+        candidate_end = cur + duration_minutes
+        fits = runs[i][0] <= cur and candidate_end <= runs[i][1]
+        if fits and not any(cur < e and s < candidate_end for s, e in taken):
+            slots.append(ld.label(cur))                    # incluimos 18:30
+        cur += GRID_MINUTES
+    return list(dict.fromkeys(slots))
+
+
+def compute_free_runs(
+    db: Session,
+    pairs: Iterable[StaffDay],
+    tzs: dict[int, str] | None = None,
+) -> dict[StaffDay, list[Run]]:
+    """Tramos libres en vivo para varios (staff, día) con una sola query (más la de zonas si falta)."""
+    pairs = sorted(set(pairs))
+    if not pairs:
+        return {}
+    sids = sorted({sid for sid, _ in pairs})
+    if tzs is None or any(sid not in tzs for sid in sids):
+        tzs = staff_timezones(db, sids)
+    days = {(sid, d): local_day(tzs.get(sid, APP_TIMEZONE), d) for sid, d in pairs}
+    lo = min(ld.start_utc for ld in days.values())
+    hi = max(ld.end_utc for ld in days.values())
+
+    rows = db.execute(text("""
+        SELECT staff_id, starts_at, ends_at
+        FROM appointments
+        WHERE staff_id = ANY(:sids)
+          AND status = 'confirmed'
+          AND starts_at < :hi
+          AND ends_at   > :lo
+        UNION ALL
+        SELECT staff_id, starts_at, ends_at
+        FROM blackouts
+        WHERE staff_id = ANY(:sids)
+          AND starts_at < :hi
+          AND ends_at   > :lo
+    """), {"sids": sids, "lo": lo, "hi": hi}).mappings().all()
+
+    busy: dict[int, list[tuple[datetime, datetime]]] = defaultdict(list)
+    for r in rows:
+        busy[r["staff_id"]].append((r["starts_at"], r["ends_at"]))
+
+    return {
+        key: free_runs(ld, [ld.span(s, e) for s, e in busy.get(key[0], ())])
+        for key, ld in days.items()
+    }
+
+
+def refresh_free_slots(
+    db: Session,
+    pairs: Iterable[StaffDay],
+    tzs: dict[int, str] | None = None,
+) -> int:
+    """
+    Recalcula y reemplaza los tramos de los (staff, día) indicados. No hace commit:
+    se llama dentro de la transacción que modificó las reservas.
+    Días pasados o fuera del horizonte se ignoran. `tzs` evita volver a leer las zonas.
+    También invalida los horarios cacheados de esos staff (al hacer commit).
+
+    Toma el lock por staff (mismo advisory lock que `lock_staff`, reentrante en la
+    transacción) en orden de id: dos refrescos del mismo (staff, día) no se pisan.
+    Sin él, en READ COMMITTED el DELETE del segundo no ve lo que insertó el primero
+    y quedan tramos duplicados/solapados.
+    """
+    pairs = list(pairs)
+    invalidate_availability(db, {sid for sid, _ in pairs})
+    today = date.today()
+    horizon_end = today + timedelta(days=FREE_SLOTS_HORIZON_DAYS)
+    # ayer del servidor todavía puede ser "hoy" para un staff en una zona atrasada
+    pairs = sorted({(sid, d) for sid, d in pairs if today - timedelta(days=1) <= d < horizon_end})
+    if not pairs:
+        return 0
+
+    if tzs is None or any(sid not in tzs for sid, _ in pairs):
+        tzs = staff_timezones(db, [sid for sid, _ in pairs])
+    for sid in sorted({sid for sid, _ in pairs}):
+        db.execute(text("SELECT pg_advisory_xact_lock(:sid)"), {"sid": sid})
+
+    runs = compute_free_runs(db, pairs, tzs)
+    keys, params = values_clause(pairs, ["integer", "date"], prefix="k")
+
+    db.execute(text(f"""
+        DELETE FROM free_slots f
+        USING ({keys}) AS k(staff_id, day)
+        WHERE f.staff_id = k.staff_id AND f.day = k.day
+    """), params)
+
+    new_rows = []
+    for (sid, d), rs in runs.items():
+        ld = local_day(tzs.get(sid, APP_TIMEZONE), d)
+        new_rows += [(sid, d, ld.at(s), ld.at(e)) for s, e in rs]
+    if new_rows:
+        values, vparams = values_clause(new_rows, ["integer", "date", "timestamptz", "timestamptz"])
+        db.execute(text(f"""
+            INSERT INTO free_slots (staff_id, day, starts_at, ends_at)
+            {values}
+        """), vparams)
+
+    db.execute(text(f"""
+        INSERT INTO free_slot_days (staff_id, day, refreshed_at)
+        SELECT k.staff_id, k.day, now() FROM ({keys}) AS k(staff_id, day)
+        ON CONFLICT (staff_id, day) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at
+    """), params)
+    return len(pairs)
+
+
+def load_free_runs(db: Session, staff_id: int, ld: LocalDay) -> list[Run] | None:
+    """Tramos materializados de un (staff, día); None si el día no está materializado."""
+    return load_free_runs_many(db, {staff_id: ld})[staff_id]
+
+
+def load_free_runs_many(db: Session, days: dict[int, LocalDay]) -> dict[int, list[Run] | None]:
+    """
+    Lo mismo para varios staff en el mismo día local (cada uno en su zona), en una
+    sola query. None para los staff cuyo día no está materializado.
+    """
+    if not days:
+        return {}
+    day = next(iter(days.values())).day
+    rows = db.execute(text("""
+        SELECT d.staff_id, f.starts_at, f.ends_at
+        FROM free_slot_days d
+        LEFT JOIN free_slots f ON f.staff_id = d.staff_id AND f.day = d.day
+        WHERE d.staff_id = ANY(:sids) AND d.day = :day
+        ORDER BY d.staff_id, f.starts_at
+    """), {"sids": sorted(days), "day": day}).all()
+    out: dict[int, list[Run] | None] = {sid: None for sid in days}
+    for sid, s, e in rows:
+        runs = out[sid] if out[sid] is not None else []
+        if s is not None:
+            runs.append(days[sid].span(s, e))
+        out[sid] = runs
+    return out
+
+
+def extend_horizon(db: Session, chunk: int = 200) -> int:
+    """
+    Borra días pasados y materializa los (staff activo, día) que falten en el horizonte.
+    Hace commit por bloque de `chunk` (staff, día): los locks de cada staff se sueltan
+    enseguida y las reservas de los demás no esperan a que termine todo el job.
+    """
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+    db.execute(text("DELETE FROM free_slots WHERE day < :d"), {"d": yesterday})
+    db.execute(text("DELETE FROM free_slot_days WHERE day < :d"), {"d": yesterday})
+    db.commit()
+
+    missing = db.execute(text("""
+        SELECT st.id, g.day::date
+        FROM staff st
+        CROSS JOIN generate_series(CAST(:today AS date), CAST(:today AS date) + :n - 1, interval '1 day') AS g(day)
+        LEFT JOIN free_slot_days d ON d.staff_id = st.id AND d.day = g.day::date
+        WHERE st.active = true AND d.staff_id IS NULL
+        ORDER BY st.id, g.day
+    """), {"today": today, "n": FREE_SLOTS_HORIZON_DAYS}).all()
+
+    done = 0
+    # ordenado por staff: los locks de refresh_free_slots se toman siempre en orden creciente
+    for i in range(0, len(missing), chunk):
+        done += refresh_free_slots(db, [(sid, d) for sid, d in missing[i:i + chunk]])
+        db.commit()
+    return done
+
+
+def main() -> None:
+    from app.db import SessionLocal, require_engine
+
+    require_engine()
+    db = SessionLocal()
+    try:
+        n = extend_horizon(db)
+        db.commit()
+        print(f"✅ free_slots OK: {n} (staff, día) materializados.")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,94 @@
-from fastapi import FastAPI, Request
+import time
+
+_IMPORT_T0 = time.perf_counter()
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.responses import RedirectResponse
+from sqlalchemy import text
+from starlette.responses import JSONResponse, RedirectResponse
+
+from app.routers import availability, bookings, admin, catalog, holds
+from app.routers.admin import admin_guard
+from app.db import engine, require_engine
+from app.compression import CompressionMiddleware
+from app.config import AUTO_CREATE_SCHEMA, COMPRESSION_ENABLED, DB_POOL_WARMUP, PROFILING_ENABLED
+from app.metrics import STARTUP_SECONDS, PrometheusMiddleware, QueryStatsMiddleware, metrics_response
+from app.profiling import ProfilingMiddleware
+from app.tenancy import TenantMiddleware, catalog_cache, current_tenant
+
+log = logging.getLogger("app.startup")
+
+# Estado del arranque para /readyz. El import no toca la DB: el esquema y el
+# pool se preparan en segundo plano y recién ahí el proceso queda "ready".
+startup = {"ready": False, "error": None, "attempts": 0, "import_ms": None, "warmup_ms": None}
+
+
+def _warmup() -> None:
+    from app.schema import create_schema, pending_upgrade
+
+    t0 = time.perf_counter()
+    if AUTO_CREATE_SCHEMA:
+        create_schema()   # sólo tablas nuevas; migrar las existentes es `python -m app.schema`
+
+    # abre DB_POOL_WARMUP conexiones a la vez para que queden en el pool
+    conns = [require_engine().connect() for _ in range(max(DB_POOL_WARMUP, 1))]
+    try:
+        for conn in conns:
+            conn.execute(text("SELECT 1"))
+        missing = pending_upgrade(conns[0])
+    finally:
+        for conn in conns:
+            conn.close()
+    if missing:
+        # not-ready (se reintenta) hasta que el deploy corra la migración
+        raise RuntimeError(f"Falta tenant_id en {missing}: correr `python -m app.schema`")
+
+    startup["warmup_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    STARTUP_SECONDS.labels("warmup").set(startup["warmup_ms"] / 1000)
+
+
+WARMUP_MAX_BACKOFF_SEC = 30
 
-from app.routers import bookings, admin, catalog
-from app.db import engine, Base
-import app.models  # asegura que se registren los modelos
 
-# ✅ crea tablas si no existen
-Base.metadata.create_all(bind=engine)
+async def _run_warmup() -> None:
+    # Si la DB no está al arrancar se reintenta con backoff (1, 2, 4... hasta 30 s):
+    # el proceso queda not-ready mientras tanto y se vuelve ready apenas conecta.
+    delay = 1
+    while True:
+        try:
+            await asyncio.to_thread(_warmup)
+            break
+        except Exception as e:  # sigue not-ready; /readyz muestra el último error
+            startup["error"] = f"{type(e).__name__}: {e}"
+            startup["attempts"] += 1
+            log.warning("warmup falló (intento %d), reintento en %ds: %s", startup["attempts"], delay, e)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WARMUP_MAX_BACKOFF_SEC)
+    startup.update(ready=True, error=None)
+    log.info("ready: import %.0f ms, warmup %.0f ms", startup["import_ms"], startup["warmup_ms"])
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    task = asyncio.create_task(_run_warmup())
+    yield
+    task.cancel()
+    if engine is not None:
+        engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# ✅ profiling bajo demanda (header X-Profile + token de admin); va adentro de CORS
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+# ✅ salón del request (header X-Tenant o subdominio); adentro de CORS para no romper los preflight
+app.add_middleware(TenantMiddleware)
 
 # ✅ CORS: una sola vez, con tu dominio de Vercel + previews
 app.add_middleware(
@@ -24,17 +103,49 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ✅ gzip/brotli de respuestas grandes (por fuera de CORS y del profiling: comprime también los profiles)
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
 
+# ✅ métricas por ruta + queries por request (van por fuera de CORS: miden también los preflight)
+app.add_middleware(QueryStatsMiddleware)
+app.add_middleware(PrometheusMiddleware)
 
 # Routers
 app.include_router(catalog.router)
 app.include_router(bookings.router)
+app.include_router(holds.router)
 app.include_router(admin.router)
+app.include_router(availability.router)
 
 @app.get("/healthz")
 def healthz():
     return {"ok": True}
 
+# Liveness: el proceso responde (no toca la DB)
+@app.get("/livez")
+def livez():
+    return {"ok": True}
+
+# Readiness: esquema listo, pool precalentado y la DB contesta
+@app.get("/readyz")
+def readyz():
+    body = dict(startup)
+    if not startup["ready"]:
+        return JSONResponse(body, status_code=503)
+    try:
+        with require_engine().connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        body.update(ready=False, error=f"{type(e).__name__}: {e}")
+        return JSONResponse(body, status_code=503)
+    return body
+
+# Métricas: rutas y salones no son públicos → mismo token que /admin (ADMIN_TOKEN global)
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(admin_guard)])
+def metrics():
+    return metrics_response()
+
 @app.get("/availability")
 def availability_alias(request: Request):
     return RedirectResponse(
@@ -45,5 +156,14 @@ def availability_alias(request: Request):
 @app.post("/__seed")
 def run_seed():
     from app.seed import main as seed_main
-    seed_main()
-    return {"ok": True}
\ No newline at end of file
+    tenant = current_tenant()
+    try:
+        seed_main(tenant.id)
+    except RuntimeError as e:  # esquema sin migrar
+        raise HTTPException(503, str(e))
+    catalog_cache.invalidate(tenant.id)
+    return {"ok": True}
+
+
+startup["import_ms"] = round((time.perf_counter() - _IMPORT_T0) * 1000, 1)
+STARTUP_SECONDS.labels("import").set(startup["import_ms"] / 1000)
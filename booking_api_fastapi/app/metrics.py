@@ -0,0 +1,178 @@
+# booking_api_fastapi/app/metrics.py
+"""
+Métricas Prometheus: latencia/conteo por ruta (middleware ASGI) + contadores de dominio.
+Se exponen en texto Prometheus en GET /metrics (con X-Admin-Token, ver app/main.py).
+
+Los valores son por proceso. Con varios workers (`uvicorn --workers N`) hay que
+definir PROMETHEUS_MULTIPROC_DIR (directorio vacío, variable de entorno del proceso
+antes de arrancar): cada worker escribe ahí y /metrics suma los de todos. Sin eso
+cada scrape ve sólo el worker que lo atendió.
+"""
+from __future__ import annotations
+
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+from starlette.datastructures import MutableHeaders
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import DEBUG, PROMETHEUS_MULTIPROC_DIR
+from app.db import QueryStats, query_stats
+
+# ---------- HTTP ----------
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "Requests HTTP por ruta y status.",
+    ["method", "route", "status"],
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Latencia HTTP por ruta.",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+# ---------- DB (hooks de app/db.py) ----------
+DB_QUERIES = Histogram(
+    "db_queries_per_request",
+    "Queries SQL por request.",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+DB_TIME = Histogram(
+    "db_time_per_request_seconds",
+    "Tiempo total en la DB por request.",
+    ["route"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+# ---------- Dominio ----------
+BOOKINGS_CREATED = Counter(
+    "bookings_created_total",
+    "Reservas creadas.",
+    ["source"],  # single | batch
+)
+BOOKING_CONFLICTS = Counter(
+    "booking_conflicts_total",
+    "Rechazos por horario ocupado (409 o conflicto por ítem).",
+    ["endpoint"],
+)
+BOOKING_DB_ERRORS = Counter(
+    "booking_db_errors_total",
+    "Respuestas 500 'DB error' al escribir reservas.",
+    ["endpoint"],
+)
+SLOTS_COMPUTED = Counter(
+    "slots_computed_total",
+    "Horarios disponibles devueltos.",
+    ["source"],  # materialized | live
+)
+
+# ---------- Arranque ----------
+STARTUP_SECONDS = Gauge(
+    "app_startup_seconds",
+    "Duración del arranque por fase (import de app.main / warmup de esquema y pool).",
+    ["phase"],
+    multiprocess_mode="max",        # con varios workers: el más lento
+)
+
+# ---------- Multi-tenant (ver app/tenancy.py) ----------
+TENANT_DB_REJECTED = Counter(
+    "tenant_db_rejected_total",
+    "Requests rechazados (503) por superar el cupo de sesiones de DB del tenant.",
+    ["tenant"],
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Lecturas de los caches por tenant.",
+    ["cache", "result"],  # hit | miss
+)
+CACHE_BYTES = Gauge(
+    "cache_bytes",
+    "Bytes ocupados por cada cache (todos los tenants).",
+    ["cache"],
+    multiprocess_mode="livesum",    # cada worker tiene sus caches: se suman
+)
+
+# rutas que no se miden
+SKIP_PATHS = {"/metrics"}
+
+
+class PrometheusMiddleware:
+    """
+    Middleware ASGI puro (sin BaseHTTPMiddleware) para no sumar overhead por request.
+    La etiqueta `route` es la plantilla de la ruta (/admin/appointments/{appt_id}),
+    nunca el path real, para no explotar la cardinalidad.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in SKIP_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            label = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_LATENCY.labels(method, label).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(method, label, str(status)).inc()
+
+
+class QueryStatsMiddleware:
+    """
+    Abre un QueryStats por request (lo llenan los hooks SQL de app/db.py),
+    lo publica en Prometheus y, con DEBUG=true, lo devuelve en `Server-Timing`.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in SKIP_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = query_stats.set(stats)
+
+        async def send_wrapper(message: Message) -> None:
+            if DEBUG and message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    f'db;dur={stats.total_ms:.1f};desc="{stats.count} queries"',
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            query_stats.reset(token)
+            label = getattr(scope.get("route"), "path", None) or "unmatched"
+            DB_QUERIES.labels(label).observe(stats.count)
+            DB_TIME.labels(label).observe(stats.total_ms / 1000)
+
+
+def metrics_response() -> Response:
+    if PROMETHEUS_MULTIPROC_DIR:
+        # registry nuevo por scrape: junta los archivos de todos los workers
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=PROMETHEUS_MULTIPROC_DIR)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,16 +1,34 @@
 from sqlalchemy import (
     Column, Integer, Boolean, Text, ForeignKey,
-    Time, SmallInteger
+    Time, SmallInteger, Index, Date, PrimaryKeyConstraint
 )
-from sqlalchemy.dialects.postgresql import TIMESTAMP
+from sqlalchemy.dialects.postgresql import TIMESTAMP, JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from .config import DEFAULT_TENANT_ID
 from .db import Base
 
 
+class Tenant(Base):
+    """Un salón. Las tablas del negocio llevan tenant_id (ver app/tenancy.py)."""
+    __tablename__ = "tenants"
+    id = Column(Integer, primary_key=True)
+    slug = Column(Text, nullable=False, unique=True)       # subdominio / header X-Tenant
+    name = Column(Text, nullable=False)
+    active = Column(Boolean, nullable=False, default=True)
+    admin_token = Column(Text)                              # None = ADMIN_TOKEN global
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+
+
+def tenant_fk():
+    return Column(Integer, ForeignKey("tenants.id", ondelete="RESTRICT"), nullable=False,
+                  server_default=str(DEFAULT_TENANT_ID))
+
+
 class Service(Base):
     __tablename__ = "services"
     id = Column(Integer, primary_key=True)
+    tenant_id = tenant_fk()
     category = Column(Text, nullable=False)
     name = Column(Text, nullable=False)
     description = Column(Text)
@@ -19,10 +37,15 @@ class Service(Base):
 
     appointments = relationship("Appointment", back_populates="service")
 
+    __table_args__ = (
+        Index("ux_services_tenant_category_name", "tenant_id", "category", "name", unique=True),
+    )
+
 
 class Staff(Base):
     __tablename__ = "staff"
     id = Column(Integer, primary_key=True)
+    tenant_id = tenant_fk()
     full_name = Column(Text, nullable=False)
     phone = Column(Text)
     active = Column(Boolean, nullable=False, default=True)
@@ -32,28 +55,45 @@ class Staff(Base):
     updated_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
 
     appointments = relationship("Appointment", back_populates="staff")
-    
+
+    __table_args__ = (
+        # no es único: dos personas pueden llamarse igual (el seed busca por nombre)
+        Index("ix_staff_tenant_full_name", "tenant_id", "full_name"),
+    )
+
 
 class StaffSchedule(Base):
     __tablename__ = "staff_schedules"
     id = Column(Integer, primary_key=True)
+    tenant_id = tenant_fk()
     staff_id = Column(Integer, ForeignKey("staff.id", ondelete="CASCADE"), nullable=False)
     day_of_week = Column(SmallInteger, nullable=False)  # 0=domingo...6=sábado
     start_time = Column(Time, nullable=False)
     end_time = Column(Time, nullable=False)
     break_minutes = Column(Integer, nullable=False, default=0)
 
+    __table_args__ = (
+        Index("ux_staff_schedules_slot", "staff_id", "day_of_week", "start_time", "end_time", unique=True),
+        Index("ix_staff_schedules_tenant_staff_dow", "tenant_id", "staff_id", "day_of_week"),
+    )
+
 class Blackout(Base):
     __tablename__ = "blackouts"
     id = Column(Integer, primary_key=True)
+    tenant_id = tenant_fk()
     staff_id = Column(Integer, ForeignKey("staff.id", ondelete="CASCADE"), nullable=False)
     reason = Column(Text)
     starts_at = Column(TIMESTAMP(timezone=True), nullable=False)
     ends_at = Column(TIMESTAMP(timezone=True), nullable=False)
 
+    __table_args__ = (
+        Index("ix_blackouts_tenant_staff_starts", "tenant_id", "staff_id", "starts_at"),
+    )
+
 class Appointment(Base):
     __tablename__ = "appointments"
     id = Column(Integer, primary_key=True)
+    tenant_id = tenant_fk()
     staff_id = Column(Integer, ForeignKey("staff.id", ondelete="RESTRICT"), nullable=False)
     service_id = Column(Integer, ForeignKey("services.id", ondelete="RESTRICT"), nullable=False)
     client_name = Column(Text, nullable=False)
@@ -64,4 +104,64 @@ class Appointment(Base):
     notes = Column(Text)
 
     staff = relationship("Staff", back_populates="appointments")
-    service = relationship("Service", back_populates="appointments")
\ No newline at end of file
+    service = relationship("Service", back_populates="appointments")
+
+    __table_args__ = (
+        Index("ix_appointments_tenant_starts", "tenant_id", "starts_at"),                  # listado de admin
+        Index("ix_appointments_tenant_staff_starts", "tenant_id", "staff_id", "starts_at"),
+    )
+
+
+class SlotHold(Base):
+    """Reserva temporal de un horario mientras el cliente completa el formulario."""
+    __tablename__ = "slot_holds"
+    id = Column(Integer, primary_key=True)
+    token = Column(Text, nullable=False, unique=True)
+    staff_id = Column(Integer, ForeignKey("staff.id", ondelete="CASCADE"), nullable=False)
+    service_id = Column(Integer, ForeignKey("services.id", ondelete="CASCADE"), nullable=False)
+    starts_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    ends_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    expires_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_slot_holds_staff_starts", "staff_id", "starts_at"),
+        Index("ix_slot_holds_expires", "expires_at"),
+    )
+
+
+class IdempotencyKey(Base):
+    """Respuesta guardada de un POST /bookings para reintentos con el mismo Idempotency-Key."""
+    __tablename__ = "idempotency_keys"
+    key = Column(Text, primary_key=True)
+    request_hash = Column(Text, nullable=False)
+    status_code = Column(Integer, nullable=False)
+    response = Column(JSONB, nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+    expires_at = Column(TIMESTAMP(timezone=True), nullable=False, index=True)
+
+
+class FreeSlot(Base):
+    """Tramo libre materializado de un staff en un día local del staff (ver app/free_slots.py)."""
+    __tablename__ = "free_slots"
+    id = Column(Integer, primary_key=True)
+    staff_id = Column(Integer, ForeignKey("staff.id", ondelete="CASCADE"), nullable=False)
+    day = Column(Date, nullable=False)
+    starts_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    ends_at = Column(TIMESTAMP(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("ix_free_slots_staff_day_starts", "staff_id", "day", "starts_at"),
+    )
+
+
+class FreeSlotDay(Base):
+    """(staff, día) ya materializados en free_slots, aunque no tengan tramos libres."""
+    __tablename__ = "free_slot_days"
+    staff_id = Column(Integer, ForeignKey("staff.id", ondelete="CASCADE"), nullable=False)
+    day = Column(Date, nullable=False)
+    refreshed_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        PrimaryKeyConstraint("staff_id", "day"),
+    )
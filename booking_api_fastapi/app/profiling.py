@@ -0,0 +1,257 @@
+# booking_api_fastapi/app/profiling.py
+"""
+Profiling bajo demanda de UN request en producción.
+
+    curl -H "X-Admin-Token: ..." -H "X-Profile: html" ".../bookings/available-slots?..."
+
+- `X-Profile: html | speedscope | pstats` activa el profiler para ese request
+  (requiere el mismo token que /admin, ver admin_guard).
+- La respuesta pasa a ser el profile (el status original va en `X-Profile-Status`)
+  y además se guarda en PROFILE_DIR (se conservan los últimos PROFILE_MAX_FILES).
+- Una ruta que no usa ProfiledRoute se rechaza con 400 antes de ejecutarla. Si el
+  endpoint no llega a correr (ej: falla una dependencia) sale la respuesta original.
+- html/speedscope usan pyinstrument (muestreo, opcional: `pip install pyinstrument`);
+  sin pyinstrument, o con `pstats`, se usa cProfile (determinístico, stdlib).
+
+Se perfila el cuerpo del endpoint en el hilo donde corre (los endpoints sync van al
+threadpool, por eso no alcanza con perfilar dentro del middleware). Sin el header
+el costo es un ContextVar.get() por request; con PROFILING_ENABLED=false (default), nada.
+"""
+from __future__ import annotations
+
+import cProfile
+import functools
+import inspect
+import marshal
+import os
+import pstats
+import re
+import secrets
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from fastapi import HTTPException
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import PROFILE_DIR, PROFILE_MAX_FILES, PROFILING_ENABLED
+
+FORMATS = {"html", "speedscope", "pstats"}
+MEDIA_TYPES = {
+    "html": "text/html; charset=utf-8",
+    "speedscope": "application/json",
+    "pstats": "application/octet-stream",
+}
+EXTENSIONS = {"html": "html", "speedscope": "speedscope.json", "pstats": "pstats"}
+
+
+@dataclass
+class ProfileSession:
+    fmt: str
+    output: bytes | None = None
+
+
+profile_session: ContextVar[ProfileSession | None] = ContextVar("profile_session", default=None)
+
+
+# ---------- Perfilado del endpoint ----------
+def _pyinstrument():
+    # import perezoso: sólo se paga cuando alguien pide un profile
+    try:
+        from pyinstrument import Profiler
+    except ImportError:  # dependencia opcional
+        return None
+    return Profiler
+
+
+class _Recorder:
+    """pyinstrument si está y se pidió html/speedscope; si no, cProfile (pstats)."""
+
+    def __init__(self, session: ProfileSession, async_mode: str = "disabled") -> None:
+        self.session = session
+        Profiler = _pyinstrument() if session.fmt != "pstats" else None
+        if Profiler is not None:
+            self.prof = Profiler(interval=0.0005, async_mode=async_mode)
+        else:
+            session.fmt = "pstats"
+            self.prof = cProfile.Profile()
+
+    def start(self) -> None:
+        if isinstance(self.prof, cProfile.Profile):
+            self.prof.enable()
+        else:
+            self.prof.start()
+
+    def stop(self) -> None:
+        if isinstance(self.prof, cProfile.Profile):
+            self.prof.disable()
+            # mismo formato que pstats.Stats.dump_stats()
+            self.session.output = marshal.dumps(pstats.Stats(self.prof).stats)
+            return
+        self.prof.stop()
+        from pyinstrument.renderers import HTMLRenderer, SpeedscopeRenderer
+        renderer = HTMLRenderer() if self.session.fmt == "html" else SpeedscopeRenderer()
+        self.session.output = self.prof.output(renderer).encode()
+
+
+def _profiled(endpoint: Callable) -> Callable:
+    # include_router() vuelve a crear la ruta con el endpoint ya envuelto
+    if getattr(endpoint, "_profiled", False):
+        return endpoint
+
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            session = profile_session.get()
+            if session is None:
+                return await endpoint(*args, **kwargs)
+            rec = _Recorder(session, async_mode="enabled")
+            rec.start()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                rec.stop()
+        async_wrapper._profiled = True
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        session = profile_session.get()
+        if session is None:
+            return endpoint(*args, **kwargs)
+        rec = _Recorder(session)
+        rec.start()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            rec.stop()
+    wrapper._profiled = True
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """route_class para los routers: envuelve el endpoint para poder perfilarlo."""
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any) -> None:
+        if PROFILING_ENABLED:
+            endpoint = _profiled(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+# ---------- Middleware ----------
+def _header(scope: Scope, name: bytes) -> str | None:
+    for k, v in scope["headers"]:
+        if k == name:
+            return v.decode("latin-1")
+    return None
+
+
+def _profilable(scope: Scope) -> bool | None:
+    """
+    Si el request va a una ruta con ProfiledRoute (se resuelve antes de ejecutarla).
+    None si no va a ninguna ruta (404/405: no hay nada que ejecutar ni perfilar).
+    """
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return isinstance(route, ProfiledRoute)
+    return None
+
+
+def _store(session: ProfileSession, scope: Scope) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", scope["path"]).strip("-") or "root"
+    # sufijo al azar: dos profiles del mismo segundo no se pisan
+    name = (f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(3)}-{scope['method']}-{slug}"
+            f".{EXTENSIONS[session.fmt]}")
+    path = os.path.join(PROFILE_DIR, name)
+    with open(path, "wb") as f:
+        f.write(session.output or b"")
+    _prune()
+    return path
+
+
+def _prune() -> None:
+    # deja sólo los PROFILE_MAX_FILES más nuevos
+    files = [e for e in os.scandir(PROFILE_DIR) if e.is_file()]
+    if len(files) <= PROFILE_MAX_FILES:
+        return
+    files.sort(key=lambda e: e.stat().st_mtime)
+    for e in files[: len(files) - PROFILE_MAX_FILES]:
+        try:
+            os.remove(e.path)
+        except FileNotFoundError:  # otro worker ya lo borró
+            pass
+
+
+class ProfilingMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        fmt = _header(scope, b"x-profile") if scope["type"] == "http" else None
+        if fmt is None:
+            await self.app(scope, receive, send)
+            return
+
+        from app.routers.admin import admin_guard
+        try:
+            admin_guard(_header(scope, b"x-admin-token"))
+        except HTTPException as e:
+            await JSONResponse({"detail": e.detail}, status_code=e.status_code)(scope, receive, send)
+            return
+        if fmt not in FORMATS:
+            await JSONResponse(
+                {"detail": f"X-Profile debe ser uno de {sorted(FORMATS)}"}, status_code=400
+            )(scope, receive, send)
+            return
+        profilable = _profilable(scope)
+        if profilable is None:
+            await self.app(scope, receive, send)
+            return
+        if not profilable:
+            # se rechaza antes de ejecutar: el request no debe correr (ni sus efectos) sin profile
+            await JSONResponse(
+                {"detail": "Esta ruta no se puede perfilar (no usa ProfiledRoute)"}, status_code=400
+            )(scope, receive, send)
+            return
+
+        session = ProfileSession(fmt)
+        token = profile_session.set(session)
+        status = 500
+        messages: list[Message] = []
+
+        # Se guarda la respuesta original: si hubo profile se devuelve el profile
+        async def capture(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            messages.append(message)
+
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            profile_session.reset(token)
+
+        if session.output is None:
+            # el endpoint no llegó a correr (ej: 401/422/503 de una dependencia): respuesta original
+            for message in messages:
+                await send(message)
+            return
+
+        path = await run_in_threadpool(_store, session, scope)   # IO de disco fuera del event loop
+        response = Response(
+            session.output,
+            media_type=MEDIA_TYPES[session.fmt],
+            headers={
+                "X-Profile-Status": str(status),
+                "X-Profile-Format": session.fmt,
+                "X-Profile-File": os.path.basename(path),
+            },
+        )
+        await response(scope, receive, send)
@@ -5,14 +5,23 @@ from typing import Optional
 import os
 from datetime import datetime, timedelta, date as date_cls
 
+from app.candidates import load_calendars, rank_candidates, suggest_assignments, window
 from app.db import get_db
+from app.metrics import BOOKING_CONFLICTS
+from app.free_slots import affected_days, refresh_free_slots, staff_timezones
+from app.utils.responses import json_response, parse_fields
+from app.utils.sql import values_clause
+from app.utils.time import local_day, local_to_utc
+from app.profiling import ProfiledRoute
+from app.routers.holds import lock_staff
+from app.tenancy import current_tenant
 
-router = APIRouter(prefix="/admin", tags=["admin"])
+router = APIRouter(prefix="/admin", tags=["admin"], route_class=ProfiledRoute)
 
 # --- Auth simple por header ---
 def admin_guard(x_admin_token: Optional[str] = Header(None)):
-    # Usá ADMIN_TOKEN en el .env del backend. Si no está, no se exige (dev).
-    expected = os.getenv("ADMIN_TOKEN", "")
+    # Token del salón (tenants.admin_token) o ADMIN_TOKEN del .env. Si no hay ninguno, no se exige (dev).
+    expected = current_tenant().admin_token or os.getenv("ADMIN_TOKEN", "")
     if expected and x_admin_token != expected:
         raise HTTPException(status_code=401, detail="Unauthorized")
     return True
@@ -20,6 +29,40 @@ def admin_guard(x_admin_token: Optional[str] = Header(None)):
 def parse_day(s: str) -> date_cls:
     return datetime.strptime(s, "%Y-%m-%d").date()
 
+# Mismo formato de fila para el listado y las respuestas de PATCH.
+# campo de salida -> expresión SQL; `fields=` elige un subconjunto (id siempre va)
+ADMIN_COLUMNS = {
+    "id":           "b.id",
+    "service_id":   "b.service_id",
+    "service_name": "s.name",
+    "staff_id":     "b.staff_id",
+    "staff_name":   "st.full_name",
+    "client_name":  "b.customer_name",
+    "client_phone": "b.customer_phone",
+    "status":       "b.status",
+    "start_utc":    "b.starts_at",
+    "end_utc":      "b.ends_at",
+}
+
+def admin_select(fields: Optional[list[str]] = None) -> str:
+    """SELECT ... FROM con sólo esas columnas; los JOIN van sólo si se pide el nombre."""
+    fields = fields or list(ADMIN_COLUMNS)
+    cols = ",\n      ".join(f"{ADMIN_COLUMNS[f]} AS {f}" for f in fields)
+    joins = []
+    if "service_name" in fields:
+        joins.append("LEFT JOIN services s ON s.id = b.service_id")
+    if "staff_name" in fields:
+        joins.append("LEFT JOIN staff    st ON st.id = b.staff_id")
+    joins = "\n    ".join(joins)
+    return f"""
+    SELECT
+      {cols}
+    FROM appointments b
+    {joins}
+"""
+
+ADMIN_SELECT = admin_select()
+
 # ---------- LISTADO ----------
 @router.get("/appointments")
 def admin_list_appointments(
@@ -27,9 +70,12 @@ def admin_list_appointments(
     date_to: Optional[str] = Query(None, description="YYYY-MM-DD"),
     staff_id: Optional[int] = None,
     status: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="campos separados por coma, ej: id,staff_id,start_utc"),
     db = Depends(get_db),
     _: bool = Depends(admin_guard),
 ):
+    selected = parse_fields(fields, ADMIN_COLUMNS, always=["id"])
+
     # Rango [from, to)
     d_from = parse_day(date_from)
     d_to   = parse_day(date_to) if date_to else d_from
@@ -37,10 +83,11 @@ def admin_list_appointments(
     end    = datetime.combine(d_to + timedelta(days=1), datetime.min.time())
 
     where = [
+        "b.tenant_id = :tenant",
         "b.starts_at >= :start",
         "b.starts_at <  :end",
     ]
-    params = {"start": start, "end": end}
+    params = {"tenant": current_tenant().id, "start": start, "end": end}
 
     if staff_id:
         where.append("b.staff_id = :staff_id")
@@ -50,33 +97,20 @@ def admin_list_appointments(
         params["status"] = status
 
     sql = f"""
-    SELECT
-      b.id,
-      b.service_id,
-      s.name           AS service_name,
-      b.staff_id,
-      st.full_name     AS staff_name,
-      b.customer_name  AS client_name,
-      b.customer_phone AS client_phone,
-      b.status,
-      b.starts_at      AS start_utc,
-      b.ends_at        AS end_utc
-    FROM appointments b
-    LEFT JOIN services s ON s.id = b.service_id
-    LEFT JOIN staff    st ON st.id = b.staff_id
+    {admin_select(selected)}
     WHERE {" AND ".join(where)}
     ORDER BY b.starts_at
     """
     rows = db.execute(text(sql), params).mappings().all()
-    # El panel espera lista de dicts
-    return [dict(r) for r in rows]
+    # El panel espera lista de dicts; se serializa directo (listas de miles de filas)
+    return json_response([dict(r) for r in rows])
 
 # ---------- PATCH (confirmar / cancelar / reprogramar / reasignar) ----------
 from pydantic import BaseModel
 
 class AppointmentPatch(BaseModel):
     status: Optional[str] = None
-    start_local: Optional[str] = None   # "YYYY-MM-DD HH:MM" en hora local
+    start_local: Optional[str] = None   # "YYYY-MM-DD HH:MM" en hora local del staff
     staff_id: Optional[int] = None
     # notes opcional: tu tabla bookings no tiene columna notes, por eso lo omito
 
@@ -92,8 +126,8 @@ def patch_appointment(
         SELECT b.*, s.duration_minutes
         FROM appointments b
         JOIN services s ON s.id = b.service_id
-        WHERE b.id = :id
-    """), {"id": appt_id}).mappings().first()
+        WHERE b.id = :id AND b.tenant_id = :tenant
+    """), {"id": appt_id, "tenant": current_tenant().id}).mappings().first()
     if not row:
         raise HTTPException(404, "Appointment not found")
 
@@ -101,18 +135,25 @@ def patch_appointment(
     new_staff   = p.staff_id
     new_start   = None
     new_end     = None
+    check_staff = new_staff if new_staff is not None else row["staff_id"]
+    tzs = staff_timezones(db, {row["staff_id"], check_staff}, current_tenant().id)
+    if check_staff not in tzs:
+        raise HTTPException(400, "Staff inexistente")
+    # serializa con reservas/holds/refrescos de free_slots de estos staff (orden de id: sin deadlocks)
+    for sid in sorted({row["staff_id"], check_staff}):
+        lock_staff(db, sid)
 
     if p.start_local:
         try:
-            # Interpretamos como hora local "naive"
+            # Hora de reloj del staff (el nuevo, si se reasigna)
             new_start = datetime.strptime(p.start_local, "%Y-%m-%d %H:%M")
         except ValueError:
             raise HTTPException(400, "start_local debe tener formato 'YYYY-MM-DD HH:MM'")
+        new_start = local_to_utc(new_start, tzs[check_staff])
         dur = int(row["duration_minutes"] or 0)
         new_end = new_start + timedelta(minutes=dur)
 
         # Chequear solapamiento si se cambia hora o staff
-        check_staff = new_staff if new_staff is not None else row["staff_id"]
         clash = db.execute(text("""
             SELECT 1
             FROM appointments
@@ -123,6 +164,7 @@ def patch_appointment(
             LIMIT 1
         """), {"staff_id": check_staff, "id": appt_id, "start": new_start, "end": new_end}).first()
         if clash:
+            BOOKING_CONFLICTS.labels("patch_appointment").inc()
             raise HTTPException(409, "El nuevo horario se solapa con otra reserva confirmada.")
 
     # Armar UPDATE dinámico
@@ -149,25 +191,363 @@ def patch_appointment(
         SET {", ".join(sets)}
         WHERE id = :id
     """), params)
+    # free_slots: el día/staff de antes y el de después
+    refresh_free_slots(db, [
+        *affected_days(row["staff_id"], row["starts_at"], row["ends_at"], tzs[row["staff_id"]]),
+        *affected_days(
+            check_staff,
+            new_start if new_start is not None else row["starts_at"],
+            new_end if new_end is not None else row["ends_at"],
+            tzs[check_staff],
+        ),
+    ], tzs)
     db.commit()
 
     # Devolver el registro actualizado en el mismo formato del listado
-    updated = db.execute(text("""
-        SELECT
-          b.id,
-          b.service_id,
-          s.name           AS service_name,
-          b.staff_id,
-          st.full_name     AS staff_name,
-          b.customer_name  AS client_name,
-          b.customer_phone AS client_phone,
-          b.status,
-          b.starts_at      AS start_utc,
-          b.ends_at        AS end_utc
-        FROM appointments b
-        LEFT JOIN services s ON s.id = b.service_id
-        LEFT JOIN staff    st ON st.id = b.staff_id
+    updated = db.execute(text(f"""
+        {ADMIN_SELECT}
         WHERE b.id = :id
     """), {"id": appt_id}).mappings().first()
 
     return {"ok": True, "appointment": dict(updated) if updated else None}
+
+
+# ---------- PATCH masivo (ej: staff enfermo → reasignar/cancelar todo el día) ----------
+class AppointmentBulkItem(AppointmentPatch):
+    id: int
+
+class AppointmentBulkPatch(BaseModel):
+    items: list[AppointmentBulkItem]
+    # atomic=True: si algún ítem falla no se aplica ninguno
+    atomic: bool = False
+
+def _overlaps(a_start, a_end, b_start, b_end) -> bool:
+    return not (a_end <= b_start or a_start >= b_end)
+
+def _batch_clashes(final: dict[int, dict], current: dict[int, dict], clashes: set[int]) -> set[int]:
+    """
+    Conflictos dentro del lote. Cada booking del lote cuenta con su estado final si se
+    aplica, o con su fila actual si falló (not_found no tiene fila; staff_not_found,
+    invalid_start_local y los que chocan se quedan como están). Como un choque nuevo
+    devuelve esa fila a su lugar, se repite hasta que no aparezcan más.
+    `clashes` trae los choques contra la DB (paso 3).
+    """
+    clashes = set(clashes)
+    while True:
+        def state(i: int):
+            if i in final and i not in clashes:
+                f = final[i]
+                return f["staff_id"], f["status"], f["start"], f["end"]
+            r = current[i]
+            return r["staff_id"], r["status"], r["starts_at"], r["ends_at"]
+
+        new = set()
+        for f in final.values():
+            if not f["moved"] or f["id"] in clashes:
+                continue
+            for other_id in current:
+                if other_id == f["id"]:
+                    continue
+                staff, status, start, end = state(other_id)
+                if (status == "confirmed"
+                        and staff == f["staff_id"]
+                        and _overlaps(f["start"], f["end"], start, end)):
+                    new.add(f["id"])
+                    break
+        if not new:
+            return clashes
+        clashes |= new
+
+@router.patch("/appointments")
+def bulk_patch_appointments(
+    body: AppointmentBulkPatch,
+    db = Depends(get_db),
+    _: bool = Depends(admin_guard),
+):
+    if not body.items:
+        return {"ok": True, "applied": 0, "results": []}
+
+    items = {it.id: it for it in body.items}
+    ids = list(items)
+    if len(ids) != len(body.items):
+        raise HTTPException(400, "Cada appointment puede aparecer una sola vez en el lote.")
+
+    # 1) Traer todos los bookings + duración en una sola query (bloqueados hasta el commit).
+    #    Mismo orden de locks que el resto: primero el advisory lock de cada staff (orden de
+    #    id), después las filas (orden de id). Los staff salen de una lectura sin lock; si
+    #    mientras tanto otro request reasignó alguna fila a un staff sin lock, se vuelve a
+    #    empezar con ese staff incluido.
+    tenant_id = current_tenant().id
+    target_staff = {it.staff_id for it in body.items if it.staff_id is not None}
+    staff_ids = set(db.execute(text("""
+        SELECT staff_id FROM appointments WHERE id = ANY(:ids) AND tenant_id = :tenant
+    """), {"ids": ids, "tenant": tenant_id}).scalars().all())
+    while True:
+        tzs = staff_timezones(db, staff_ids | target_staff, tenant_id)
+        # serializa con reservas/holds/refrescos de free_slots de estos staff (orden de id: sin deadlocks)
+        for sid in sorted(tzs):
+            lock_staff(db, sid)
+        rows = db.execute(text("""
+            SELECT b.id, b.staff_id, b.status, b.starts_at, b.ends_at, s.duration_minutes
+            FROM appointments b
+            JOIN services s ON s.id = b.service_id
+            WHERE b.id = ANY(:ids) AND b.tenant_id = :tenant
+            ORDER BY b.id
+            FOR UPDATE OF b
+        """), {"ids": ids, "tenant": tenant_id}).mappings().all()
+        moved_away = {r["staff_id"] for r in rows} - set(tzs) - staff_ids
+        if not moved_away:
+            break
+        db.rollback()          # suelta los locks para volver a tomarlos en orden
+        staff_ids |= moved_away
+    current = {r["id"]: r for r in rows}
+
+    # 2) Estado final de cada ítem (sin tocar la DB todavía)
+    results: dict[int, dict] = {}
+    final: dict[int, dict] = {}
+    for it in body.items:
+        row = current.get(it.id)
+        if not row:
+            results[it.id] = {"id": it.id, "ok": False, "error": "not_found"}
+            continue
+
+        staff = it.staff_id if it.staff_id is not None else row["staff_id"]
+        if staff not in tzs:
+            results[it.id] = {"id": it.id, "ok": False, "error": "staff_not_found"}
+            continue
+        start, end = row["starts_at"], row["ends_at"]
+        if it.start_local:
+            try:
+                start = datetime.strptime(it.start_local, "%Y-%m-%d %H:%M")
+            except ValueError:
+                results[it.id] = {"id": it.id, "ok": False, "error": "invalid_start_local"}
+                continue
+            start = local_to_utc(start, tzs[staff])   # hora de reloj del staff final
+            end = start + timedelta(minutes=int(row["duration_minutes"] or 0))
+
+        final[it.id] = {
+            "id": it.id,
+            "staff_id": staff,
+            "status": it.status if it.status is not None else row["status"],
+            "start": start,
+            "end": end,
+            # sólo se chequea solapamiento si cambia hora o staff
+            "moved": bool(it.start_local) or it.staff_id is not None,
+        }
+
+    moved = [f for f in final.values() if f["moved"]]
+
+    # 3) Conflictos contra la DB en UNA query set-based.
+    #    Los bookings del lote se excluyen: se comparan entre sí en el paso 4.
+    clashes: set[int] = set()
+    if moved:
+        values, params = values_clause(
+            [(f["id"], f["staff_id"], f["start"], f["end"]) for f in moved],
+            ["integer", "integer", "timestamptz", "timestamptz"],
+        )
+        params["batch_ids"] = ids
+        hit = db.execute(text(f"""
+            SELECT DISTINCT c.id
+            FROM ({values}) AS c(id, staff_id, starts_at, ends_at)
+            JOIN appointments a
+              ON a.staff_id = c.staff_id
+             AND a.status = 'confirmed'
+             AND a.id <> ALL(:batch_ids)
+             AND NOT (c.ends_at <= a.starts_at OR c.starts_at >= a.ends_at)
+        """), params).scalars().all()
+        clashes.update(hit)
+
+    # 4) Conflictos dentro del propio lote (incluye las filas de los ítems que fallaron)
+    clashes = _batch_clashes(final, current, clashes)
+
+    if clashes:
+        BOOKING_CONFLICTS.labels("bulk_patch_appointments").inc(len(clashes))
+    for appt_id in clashes:
+        results[appt_id] = {"id": appt_id, "ok": False, "error": "conflict"}
+        final.pop(appt_id, None)
+
+    if body.atomic and results:
+        db.rollback()
+        return {
+            "ok": False,
+            "applied": 0,
+            "results": [results.get(i) or {"id": i, "ok": False, "error": "aborted"} for i in ids],
+        }
+
+    # 5) Un solo UPDATE ... FROM (VALUES ...) + un solo commit
+    if final:
+        values, params = values_clause(
+            [
+                (
+                    f["id"],
+                    items[f["id"]].status,
+                    items[f["id"]].staff_id,
+                    f["start"] if items[f["id"]].start_local else None,
+                    f["end"] if items[f["id"]].start_local else None,
+                )
+                for f in final.values()
+            ],
+            ["integer", "text", "integer", "timestamptz", "timestamptz"],
+        )
+        try:
+            db.execute(text(f"""
+                UPDATE appointments a
+                SET status    = COALESCE(v.status,    a.status),
+                    staff_id  = COALESCE(v.staff_id,  a.staff_id),
+                    starts_at = COALESCE(v.starts_at, a.starts_at),
+                    ends_at   = COALESCE(v.ends_at,   a.ends_at)
+                FROM ({values}) AS v(id, status, staff_id, starts_at, ends_at)
+                WHERE a.id = v.id
+            """), params)
+            refresh_free_slots(db, [
+                p
+                for f in final.values()
+                for p in (
+                    *affected_days(current[f["id"]]["staff_id"], current[f["id"]]["starts_at"],
+                                   current[f["id"]]["ends_at"], tzs[current[f["id"]]["staff_id"]]),
+                    *affected_days(f["staff_id"], f["start"], f["end"], tzs[f["staff_id"]]),
+                )
+            ], tzs)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise HTTPException(500, f"DB error: {e}")
+    else:
+        db.rollback()
+
+    # 6) Devolver los registros actualizados en el formato del listado
+    updated = {}
+    if final:
+        updated = {
+            r["id"]: dict(r)
+            for r in db.execute(text(f"""
+                {ADMIN_SELECT}
+                WHERE b.id = ANY(:ids)
+            """), {"ids": list(final)}).mappings().all()
+        }
+    for appt_id in final:
+        results[appt_id] = {"id": appt_id, "ok": True, "appointment": updated.get(appt_id)}
+
+    return {
+        "ok": len(final) == len(ids),
+        "applied": len(final),
+        "results": [results[i] for i in ids],
+    }
+
+
+# ---------- Candidatos para reasignar (todo el staff activo en una sola query) ----------
+CANDIDATE_SELECT = """
+    SELECT b.id, b.staff_id, b.service_id, b.status, b.starts_at, b.ends_at
+    FROM appointments b
+"""
+
+def _candidate_item(entry: dict) -> dict:
+    appt = entry["appointment"]
+    return {
+        "appointment": {
+            "id": appt["id"],
+            "staff_id": appt["staff_id"],
+            "service_id": appt["service_id"],
+            "status": appt["status"],
+            "start_utc": appt["starts_at"],
+            "end_utc": appt["ends_at"],
+        },
+        "suggested_staff_id": entry["suggested_staff_id"],
+        "candidates": entry["candidates"],
+    }
+
+@router.get("/appointments/candidates")
+def day_candidates(
+    date: str = Query(..., description="YYYY-MM-DD, día local del staff"),
+    staff_id: int = Query(..., description="staff cuyos turnos hay que reasignar"),
+    db = Depends(get_db),
+    _: bool = Depends(admin_guard),
+):
+    """
+    Todos los turnos confirmados de `staff_id` en el día, cada uno con el staff que
+    podría tomarlo (mejor primero) y una sugerencia sin choques entre sí.
+    `patch` se puede mandar tal cual a PATCH /admin/appointments.
+    """
+    tenant = current_tenant()
+    tzs = staff_timezones(db, [staff_id], tenant.id)
+    if staff_id not in tzs:
+        raise HTTPException(404, "Staff not found")
+    ld = local_day(tzs[staff_id], parse_day(date))
+
+    appts = db.execute(text(f"""
+        {CANDIDATE_SELECT}
+        WHERE b.tenant_id = :tenant
+          AND b.staff_id = :staff_id
+          AND b.status = 'confirmed'
+          AND b.starts_at >= :start
+          AND b.starts_at <  :end
+        ORDER BY b.starts_at
+    """), {"tenant": tenant.id, "staff_id": staff_id, "start": ld.start_utc, "end": ld.end_utc}).mappings().all()
+    if not appts:
+        return {"date": date, "staff_id": staff_id, "items": [], "patch": {"atomic": True, "items": []}}
+
+    lo, hi = window(appts)
+    cals = load_calendars(db, tenant.id, lo, hi, exclude_appointments=[a["id"] for a in appts])
+    items = [_candidate_item(e) for e in suggest_assignments(cals, appts, exclude_staff=[staff_id])]
+    return {
+        "date": date,
+        "staff_id": staff_id,
+        "items": items,
+        "patch": {
+            "atomic": True,
+            "items": [
+                {"id": it["appointment"]["id"], "staff_id": it["suggested_staff_id"]}
+                for it in items if it["suggested_staff_id"] is not None
+            ],
+        },
+    }
+
+@router.get("/appointments/{appt_id}/candidates")
+def appointment_candidates(
+    appt_id: int,
+    db = Depends(get_db),
+    _: bool = Depends(admin_guard),
+):
+    """Staff activo que podría tomar el turno en el mismo horario, mejor primero."""
+    tenant = current_tenant()
+    appt = db.execute(text(f"""
+        {CANDIDATE_SELECT}
+        WHERE b.id = :id AND b.tenant_id = :tenant
+    """), {"id": appt_id, "tenant": tenant.id}).mappings().first()
+    if not appt:
+        raise HTTPException(404, "Appointment not found")
+
+    lo, hi = window([appt])
+    cals = load_calendars(db, tenant.id, lo, hi, exclude_appointments=[appt_id])
+    ranked = rank_candidates(cals, appt["starts_at"], appt["ends_at"], exclude_staff=[appt["staff_id"]])
+    return _candidate_item({
+        "appointment": appt,
+        "suggested_staff_id": ranked[0]["staff_id"] if ranked and ranked[0]["available"] else None,
+        "candidates": ranked,
+    })
+
+
+# ---------- free_slots (cambios fuera de la API: blackouts, horarios, SQL manual) ----------
+class FreeSlotsRefresh(BaseModel):
+    date_from: str                    # YYYY-MM-DD
+    date_to: Optional[str] = None     # YYYY-MM-DD (inclusive)
+    staff_id: Optional[int] = None    # None = todo el staff activo
+
+@router.post("/free-slots/refresh")
+def refresh_free_slots_range(
+    body: FreeSlotsRefresh,
+    db = Depends(get_db),
+    _: bool = Depends(admin_guard),
+):
+    d_from = parse_day(body.date_from)
+    d_to   = parse_day(body.date_to) if body.date_to else d_from
+    staff_ids = db.execute(text("""
+        SELECT id FROM staff
+        WHERE tenant_id = :tenant
+          AND (CAST(:sid AS integer) IS NULL AND active = true OR id = :sid)
+    """), {"tenant": current_tenant().id, "sid": body.staff_id}).scalars().all()
+
+    days = [d_from + timedelta(days=i) for i in range((d_to - d_from).days + 1)]
+    n = refresh_free_slots(db, [(sid, d) for sid in staff_ids for d in days])
+    db.commit()
+    return {"ok": True, "refreshed": n}
@@ -1,104 +1,104 @@
+from collections import defaultdict
+from datetime import date, datetime
+
 from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from datetime import date, datetime, timedelta
+
+from ..config import APP_TIMEZONE
 from ..db import get_db
-from .. import models, schemas
-from ..config import APP_TIMEZONE, DEFAULT_BUFFER_MIN
-from ..utils.time import local_date_bounds_utc, utc_to_local, combine_date_time_local, iter_range
+from ..free_slots import compute_free_runs, grid_slots, load_free_runs_many
+from ..metrics import SLOTS_COMPUTED
+from ..profiling import ProfiledRoute
+from ..tenancy import current_tenant
+from ..utils.responses import json_response, parse_fields
+from ..utils.time import local_day, zone
+from .. import schemas
 
-router = APIRouter(prefix="/availability", tags=["availability"])
+# GET /availability (sin sufijo) es el redirect a /bookings/available-slots de main.py
+router = APIRouter(prefix="/availability/by-staff", tags=["availability"], route_class=ProfiledRoute)
 
 @router.get("", response_model=list[schemas.AvailabilityPerStaff])
 def availability(
     service_id: int = Query(..., description="ID del servicio"),
     day: date = Query(..., description="Fecha local YYYY-MM-DD"),
     staff_id: int | None = Query(None, description="Filtrar por staff (opcional)"),
+    fields: str | None = Query(None, description="campos separados por coma, ej: staff_id,slots"),
     db: Session = Depends(get_db),
 ):
-    service = db.get(models.Service, service_id)
-    if not service:
+    """
+    Los horarios de /bookings/available-slots para todo el staff activo (o uno).
+    Mismo cálculo (free_slots + holds vigentes + grilla), con una query por paso
+    para todo el staff en vez de una por staff.
+    """
+    selected = parse_fields(fields, schemas.AvailabilityPerStaff.model_fields, always=["staff_id"])
+    tenant = current_tenant()
+    svc = db.execute(text("""
+        SELECT duration_minutes FROM services WHERE id = :sid AND tenant_id = :tenant
+    """), {"sid": service_id, "tenant": tenant.id}).first()
+    if not svc:
         raise HTTPException(status_code=404, detail="Servicio no encontrado")
-    duration = service.duration_minutes
-    buffer_min = DEFAULT_BUFFER_MIN
+    duration = int(svc.duration_minutes)
 
-    staff_q = db.query(models.Staff).filter(models.Staff.active == True)
-    if staff_id:
-        staff_q = staff_q.filter(models.Staff.id == staff_id)
-    staffs = staff_q.all()
+    staffs = db.execute(text("""
+        SELECT id, full_name, timezone
+        FROM staff
+        WHERE tenant_id = :tenant
+          AND active = true
+          AND (CAST(:staff_id AS integer) IS NULL OR id = :staff_id)
+        ORDER BY id
+    """), {"tenant": tenant.id, "staff_id": staff_id}).mappings().all()
     if not staffs:
         return []
 
-    day_start_utc, day_end_utc = local_date_bounds_utc(day, APP_TIMEZONE)
-
-    results: list[schemas.AvailabilityPerStaff] = []
-    for st in staffs:
-        # convertir: lunes=0..domingo=6  a esquema 0=domingo..6=sábado
-        dow = (day.weekday() + 1) % 7
-        schedules = (db.query(models.StaffSchedule)
-                       .filter(models.StaffSchedule.staff_id == st.id,
-                               models.StaffSchedule.day_of_week == dow)
-                       .all())
-
-        if not schedules:
-            results.append(schemas.AvailabilityPerStaff(
-                staff_id=st.id, staff_name=st.full_name, date_local=str(day),
-                service_id=service_id, slots=[]
-            ))
-            continue
+    slots: dict[int, list[str]] = {st["id"]: [] for st in staffs}
+    if not selected or "slots" in selected:
+        # día local de cada staff en su zona; los días ya pasados para el staff no tienen horarios
+        tzs = {st["id"]: st["timezone"] or APP_TIMEZONE for st in staffs}
+        days = {
+            sid: local_day(tz, day)
+            for sid, tz in tzs.items()
+            if day >= datetime.now(zone(tz)).date()
+        }
 
-        appts = (db.query(models.Appointment)
-                   .filter(models.Appointment.staff_id == st.id,
-                           models.Appointment.starts_at < day_end_utc,
-                           models.Appointment.ends_at > day_start_utc)
-                   .all())
-        blks = (db.query(models.Blackout)
-                   .filter(models.Blackout.staff_id == st.id,
-                           models.Blackout.starts_at < day_end_utc,
-                           models.Blackout.ends_at > day_start_utc)
-                   .all())
+        # tramos libres: materializados (una query) y, los que falten, en vivo (otra)
+        runs = load_free_runs_many(db, days)
+        live = {(sid, day) for sid, r in runs.items() if r is None}
+        for (sid, _), r in compute_free_runs(db, live, tzs).items():
+            runs[sid] = r
 
-        busy_local: list[tuple[datetime, datetime]] = []
-        for a in appts:
-            busy_local.append((
-                utc_to_local(a.starts_at, APP_TIMEZONE),
-                utc_to_local(a.ends_at,   APP_TIMEZONE),
-            ))
-        for b in blks:
-            busy_local.append((
-                utc_to_local(b.starts_at, APP_TIMEZONE),
-                utc_to_local(b.ends_at,   APP_TIMEZONE),
-            ))
+        # holds vigentes de todo ese staff en el día (duran minutos, no se materializan)
+        held: dict[int, list[tuple[int, int]]] = defaultdict(list)
+        if days:
+            rows = db.execute(text("""
+                SELECT staff_id, starts_at, ends_at
+                FROM slot_holds
+                WHERE staff_id = ANY(:sids)
+                  AND expires_at > now()
+                  AND starts_at < :hi
+                  AND ends_at   > :lo
+            """), {"sids": sorted(days),
+                   "lo": min(ld.start_utc for ld in days.values()),
+                   "hi": max(ld.end_utc for ld in days.values())}).mappings().all()
+            for r in rows:
+                held[r["staff_id"]].append(days[r["staff_id"]].span(r["starts_at"], r["ends_at"]))
 
-        def overlaps(a_start, a_end, b_start, b_end):
-            return a_start < b_end and a_end > b_start
+        for sid, ld in days.items():
+            slots[sid] = grid_slots(ld, runs[sid], held[sid], duration)
+            SLOTS_COMPUTED.labels("live" if (sid, day) in live else "materialized").inc(len(slots[sid]))
 
-        out_slots: list[schemas.SlotOut] = []
-        for sch in schedules:
-            start_dt = combine_date_time_local(day, sch.start_time, APP_TIMEZONE)
-            end_dt   = combine_date_time_local(day, sch.end_time,   APP_TIMEZONE)
-
-            step = 5  # minutos
-            for cand in iter_range(start_dt, end_dt, step):
-                cand_end = cand + timedelta(minutes=duration + buffer_min)
-                if cand_end > end_dt:
-                    break
-                if any(overlaps(cand, cand_end, b_s, b_e) for (b_s, b_e) in busy_local):
-                    continue
-                out_slots.append(schemas.SlotOut(time_local=cand.strftime("%H:%M")))
-
-        # dedup
-        seen, unique = set(), []
-        for s in out_slots:
-            if s.time_local not in seen:
-                seen.add(s.time_local)
-                unique.append(s)
-
-        results.append(schemas.AvailabilityPerStaff(
-            staff_id=st.id,
-            staff_name=st.full_name,
+    results = [
+        schemas.AvailabilityPerStaff(
+            staff_id=st["id"],
+            staff_name=st["full_name"],
             date_local=str(day),
             service_id=service_id,
-            slots=unique
-        ))
-
+            slots=[schemas.SlotOut(time_local=t) for t in slots[st["id"]]],
+        )
+        for st in staffs
+    ]
+    if selected:
+        # sólo los campos pedidos; sin pasar por response_model (que los exige todos)
+        keep = set(selected)
+        return json_response([r.model_dump(include=keep) for r in results])
     return results
@@ -1,18 +1,34 @@
 # app/routers/bookings.py
-from fastapi import APIRouter, Depends, HTTPException, Query
+import hashlib
+import json
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel, Field
-from datetime import datetime, timedelta, time, date as date_cls, timezone
+from datetime import datetime, timedelta
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy import text
+from app.config import APP_TIMEZONE, IDEMPOTENCY_TTL_SEC
 from app.db import get_db
+from app.metrics import BOOKING_CONFLICTS, BOOKING_DB_ERRORS, BOOKINGS_CREATED, SLOTS_COMPUTED
+from app.free_slots import (
+    affected_days, compute_free_runs, grid_slots, load_free_runs, refresh_free_slots, staff_timezones,
+    work_window,
+)
+from app.routers.holds import lock_staff
+from app.tenancy import availability_cache, current_tenant
+from app.utils.sql import values_clause
+from app.utils.time import local_day, local_to_utc, utc_to_local, zone
+from app.profiling import ProfiledRoute
 
-router = APIRouter(prefix="/bookings", tags=["bookings"])
+router = APIRouter(prefix="/bookings", tags=["bookings"], route_class=ProfiledRoute)
 
 class BookingIn(BaseModel):
     service_id: int
     staff_id: int
     client_name: str = Field(min_length=2)
     client_phone: str | None = ""           # ← tolera vacío
-    starts_at: datetime                        # ej: "2025-09-02T17:30:00-04:00"
+    starts_at: datetime                        # ej: "2025-09-02T17:30:00-04:00" (sin offset = hora del staff)
+    hold_token: str | None = None              # hold de POST /bookings/holds (opcional)
 
 class BookingOut(BaseModel):
     id: int
@@ -25,46 +41,139 @@ class BookingOut(BaseModel):
     price: int
     status: str
 
+# --------- Idempotency-Key ----------
+def _request_hash(payload: BaseModel) -> str:
+    body = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(body.encode()).hexdigest()
+
+def _replay_idempotent(db, key: str, req_hash: str) -> JSONResponse | None:
+    """
+    Bloquea la key hasta el fin de la transacción (un duplicado concurrente espera
+    al primero) y devuelve la respuesta guardada si ya existe y no venció.
+    """
+    db.execute(text("SELECT pg_advisory_xact_lock(2, hashtext(:key))"), {"key": key})
+    saved = db.execute(text("""
+        SELECT request_hash, status_code, response
+        FROM idempotency_keys
+        WHERE key = :key AND expires_at > now()
+    """), {"key": key}).mappings().first()
+    if not saved:
+        return None
+    db.rollback()  # libera el lock, no hay nada que escribir
+    if saved["request_hash"] != req_hash:
+        raise HTTPException(422, "Idempotency-Key ya usada con otro payload.")
+    return JSONResponse(saved["response"], status_code=saved["status_code"],
+                        headers={"Idempotent-Replayed": "true"})
+
+def _store_idempotent(db, key: str, req_hash: str, status_code: int, response) -> None:
+    # Misma transacción que la reserva; pisa una key vencida si la hubiera
+    db.execute(text("""
+        INSERT INTO idempotency_keys (key, request_hash, status_code, response, expires_at)
+        VALUES (:key, :hash, :status, CAST(:response AS jsonb), now() + make_interval(secs => :ttl))
+        ON CONFLICT (key) DO UPDATE
+        SET request_hash = EXCLUDED.request_hash,
+            status_code  = EXCLUDED.status_code,
+            response     = EXCLUDED.response,
+            created_at   = now(),
+            expires_at   = EXCLUDED.expires_at
+    """), {
+        "key": key,
+        "hash": req_hash,
+        "status": status_code,
+        "response": json.dumps(jsonable_encoder(response)),
+        "ttl": IDEMPOTENCY_TTL_SEC,
+    })
+    # barrido incremental de vencidas
+    db.execute(text("""
+        DELETE FROM idempotency_keys
+        WHERE key IN (SELECT key FROM idempotency_keys WHERE expires_at <= now() LIMIT 100)
+    """))
+
 @router.post("", response_model=BookingOut)
-def create_booking(payload: BookingIn, db=Depends(get_db)):
-    # 0) Normalizar datetime: si viene con tz, pasarlo a hora local "naive"
-    start = payload.starts_at
-    if start.tzinfo is not None:
-        start = start.astimezone().replace(tzinfo=None)
+def create_booking(
+    payload: BookingIn,
+    db=Depends(get_db),
+    idempotency_key: str | None = Header(None, max_length=255),
+):
+    tenant = current_tenant()
+
+    # Reintento con la misma Idempotency-Key → devolver la respuesta original sin re-procesar
+    req_hash = None
+    if idempotency_key:
+        idempotency_key = f"{tenant.id}:{idempotency_key}"   # cada salón tiene sus keys
+        req_hash = _request_hash(payload)
+        replay = _replay_idempotent(db, idempotency_key, req_hash)
+        if replay is not None:
+            return replay
 
-    # 1) Servicio (duración + precio)
+    # 1) Servicio (duración + precio) y zona horaria del staff, ambos del salón
     svc = db.execute(text("""
-        SELECT id, duration_minutes, price
-        FROM services
-        WHERE id = :sid
-    """), {"sid": payload.service_id}).mappings().first()
+        SELECT s.id, s.duration_minutes, s.price, st.timezone
+        FROM services s
+        JOIN staff st ON st.id = :staff_id AND st.tenant_id = s.tenant_id
+        WHERE s.id = :sid AND s.tenant_id = :tenant
+    """), {"sid": payload.service_id, "staff_id": payload.staff_id, "tenant": tenant.id}).mappings().first()
     if not svc:
-        raise HTTPException(400, "Servicio inexistente")
+        db.rollback()
+        raise HTTPException(400, "Servicio o staff inexistente")
+    tz_name = svc["timezone"] or APP_TIMEZONE
 
-    # 2) Calcular fin
+    # 2) Normalizar a UTC (sin offset = hora de reloj del staff) y calcular fin
+    start = local_to_utc(payload.starts_at, tz_name)
     ends_at = start + timedelta(minutes=int(svc["duration_minutes"]))
 
-    # 3) Solapamientos para el mismo staff (confirmed), SIN tsrange
+    # 3) Solapamientos para el mismo staff (confirmed + holds ajenos vigentes), SIN tsrange
+    lock_staff(db, payload.staff_id)
+    hold_id = None
+    if payload.hold_token:
+        # el hold tiene que estar vigente y ser de este staff y este horario
+        hold_id = db.execute(text("""
+            SELECT id
+            FROM slot_holds
+            WHERE token = :token
+              AND staff_id = :staff_id
+              AND expires_at > now()
+              AND starts_at < :end
+              AND ends_at   > :start
+        """), {"token": payload.hold_token, "staff_id": payload.staff_id,
+               "start": start, "end": ends_at}).scalar()
+        if hold_id is None:
+            db.rollback()
+            BOOKING_CONFLICTS.labels("create_booking").inc()
+            raise HTTPException(409, "El hold no existe, venció o no es de este staff y horario.")
     clash = db.execute(text("""
         SELECT 1
         FROM appointments
-        WHERE staff_id = :staff_id
+        WHERE tenant_id = :tenant
+          AND staff_id = :staff_id
           AND status = 'confirmed'
           AND NOT (:end <= starts_at OR :start >= ends_at)
+        UNION ALL
+        SELECT 1
+        FROM slot_holds
+        WHERE staff_id = :staff_id
+          AND expires_at > now()
+          AND id IS DISTINCT FROM :hold_id
+          AND NOT (:end <= starts_at OR :start >= ends_at)
         LIMIT 1
-    """), {"staff_id": payload.staff_id, "start": start, "end": ends_at}).first()
+    """), {"tenant": tenant.id, "staff_id": payload.staff_id, "start": start, "end": ends_at,
+           "hold_id": hold_id}).first()
     if clash:
+        db.rollback()
+        BOOKING_CONFLICTS.labels("create_booking").inc()
         raise HTTPException(409, "Ese horario ya fue tomado. Elegí otro.")
 
     # 4) Insertar
     try:
         row = db.execute(text("""
             INSERT INTO appointments
-                (service_id, staff_id, customer_name, customer_phone, starts_at, ends_at, price, status)
+                (tenant_id, service_id, staff_id, customer_name, customer_phone, starts_at, ends_at, price, status)
             VALUES
-                (:service_id, :staff_id, :name, :phone, :start, :end, :price, 'confirmed')
-            RETURNING id, service_id, staff_id, customer_name, customer_phone, starts_at, ends_at, price, status
+                (:tenant, :service_id, :staff_id, :name, :phone, :start, :end, :price, 'confirmed')
+            RETURNING id, service_id, staff_id, customer_name AS client_name, customer_phone AS client_phone,
+                      starts_at, ends_at, price, status
         """), {
+            "tenant": tenant.id,
             "service_id": payload.service_id,
             "staff_id": payload.staff_id,
             "name": payload.client_name,
@@ -73,13 +182,199 @@ def create_booking(payload: BookingIn, db=Depends(get_db)):
             "end": ends_at,
             "price": int(svc["price"]),
         }).mappings().first()
+        if hold_id is not None:
+            # el hold se consume en la misma transacción que la reserva
+            db.execute(text("DELETE FROM slot_holds WHERE id = :id"), {"id": hold_id})
+        refresh_free_slots(db, affected_days(payload.staff_id, start, ends_at, tz_name),
+                           {payload.staff_id: tz_name})
+        row = BookingOut(**row)
+        if idempotency_key:
+            _store_idempotent(db, idempotency_key, req_hash, 200, row)
         db.commit()
     except Exception as e:
         db.rollback()
+        BOOKING_DB_ERRORS.labels("create_booking").inc()
         raise HTTPException(500, f"DB error: {e}")
 
+    BOOKINGS_CREATED.labels("single").inc()
+
     return row
 
+# --------- Reservas en lote / recurrentes ----------
+class RecurrenceIn(BaseModel):
+    every_weeks: int = Field(ge=1, le=52)
+    count: int = Field(ge=1, le=52)          # cantidad total de sesiones (incluye la primera)
+
+class BookingBatchIn(BaseModel):
+    bookings: list[BookingIn] = Field(min_length=1, max_length=100)
+    # si viene, bookings[0] es la primera sesión y se repite cada N semanas
+    recurrence: RecurrenceIn | None = None
+    # False: si alguna sesión choca no se guarda ninguna
+    allow_partial: bool = False
+
+@router.post("/batch")
+def create_bookings_batch(payload: BookingBatchIn, db=Depends(get_db)):
+    tenant = current_tenant()
+
+    # 0) Staff del lote (zona horaria + que sean del salón) y expandir recurrencia
+    items = payload.bookings
+    tzs = staff_timezones(db, [it.staff_id for it in items], tenant.id)
+    missing = sorted({it.staff_id for it in items} - set(tzs))
+    if missing:
+        raise HTTPException(400, f"Staff inexistente: {missing}")
+    if payload.recurrence:
+        if len(items) != 1:
+            raise HTTPException(422, "Con 'recurrence' se envía una sola reserva (la primera sesión).")
+        first, rec = items[0], payload.recurrence
+        # misma hora de reloj del staff cada vez, aunque en el medio cambie el horario de verano
+        tz_name = tzs[first.staff_id]
+        wall = utc_to_local(local_to_utc(first.starts_at, tz_name), tz_name).replace(tzinfo=None)
+        # el hold (si viene) es sólo de la primera sesión
+        items = [
+            first.model_copy(update={"starts_at": wall + timedelta(weeks=rec.every_weeks * k),
+                                     "hold_token": first.hold_token if k == 0 else None})
+            for k in range(rec.count)
+        ]
+    hold_tokens = [it.hold_token for it in items if it.hold_token]
+    if len(hold_tokens) != len(set(hold_tokens)):
+        raise HTTPException(422, "Cada hold_token puede usarse en una sola reserva del lote.")
+
+    # 1) Servicios de todo el lote en una sola query
+    svcs = {
+        r["id"]: r
+        for r in db.execute(text("""
+            SELECT id, duration_minutes, price
+            FROM services
+            WHERE id = ANY(:sids) AND tenant_id = :tenant
+        """), {"sids": list({it.service_id for it in items}), "tenant": tenant.id}).mappings().all()
+    }
+    missing = sorted({it.service_id for it in items} - set(svcs))
+    if missing:
+        raise HTTPException(400, f"Servicio inexistente: {missing}")
+
+    # 2) Normalizar horarios a UTC y calcular fin
+    occ = []
+    for idx, it in enumerate(items):
+        start = local_to_utc(it.starts_at, tzs[it.staff_id])
+        svc = svcs[it.service_id]
+        occ.append({
+            "index": idx,
+            "item": it,
+            "start": start,
+            "end": start + timedelta(minutes=int(svc["duration_minutes"])),
+            "price": int(svc["price"]),
+        })
+
+    # 3) Solapamientos contra la DB (reservas + holds ajenos): una sola query para todo el lote
+    for sid in sorted({it.staff_id for it in items}):
+        lock_staff(db, sid)
+
+    # holds del lote: vigentes y del mismo staff y horario que su reserva; si no, esa reserva se rechaza
+    held = {}
+    if hold_tokens:
+        values, params = values_clause(
+            [(o["index"], o["item"].hold_token, o["item"].staff_id, o["start"], o["end"])
+             for o in occ if o["item"].hold_token],
+            ["integer", "text", "integer", "timestamptz", "timestamptz"],
+        )
+        held = dict(db.execute(text(f"""
+            WITH c(idx, token, staff_id, starts_at, ends_at) AS ({values})
+            SELECT c.idx, h.id
+            FROM c
+            JOIN slot_holds h
+              ON h.token = c.token
+             AND h.staff_id = c.staff_id
+             AND h.expires_at > now()
+             AND h.starts_at < c.ends_at
+             AND h.ends_at   > c.starts_at
+        """), params).all())
+    bad_holds = {o["index"] for o in occ if o["item"].hold_token and o["index"] not in held}
+
+    values, params = values_clause(
+        [(o["index"], o["item"].staff_id, o["start"], o["end"], held.get(o["index"])) for o in occ],
+        ["integer", "integer", "timestamptz", "timestamptz", "integer"],
+    )
+    params["tenant"] = tenant.id
+    clashes = set(db.execute(text(f"""
+        WITH c(idx, staff_id, starts_at, ends_at, hold_id) AS ({values})
+        SELECT c.idx
+        FROM c
+        JOIN appointments a
+          ON a.tenant_id = :tenant
+         AND a.staff_id = c.staff_id
+         AND a.status = 'confirmed'
+         AND NOT (c.ends_at <= a.starts_at OR c.starts_at >= a.ends_at)
+        UNION
+        SELECT c.idx
+        FROM c
+        JOIN slot_holds h
+          ON h.staff_id = c.staff_id
+         AND h.expires_at > now()
+         AND h.id IS DISTINCT FROM c.hold_id
+         AND NOT (c.ends_at <= h.starts_at OR c.starts_at >= h.ends_at)
+    """), params).scalars().all()) | bad_holds
+
+    # 4) Solapamientos dentro del propio lote (gana la primera)
+    accepted: list[dict] = []
+    for o in occ:
+        if o["index"] in clashes:
+            continue
+        if any(a["item"].staff_id == o["item"].staff_id
+               and not (o["end"] <= a["start"] or o["start"] >= a["end"])
+               for a in accepted):
+            clashes.add(o["index"])
+            continue
+        accepted.append(o)
+
+    conflicts = [
+        {"index": o["index"], "staff_id": o["item"].staff_id, "starts_at": o["start"],
+         "error": "invalid_hold" if o["index"] in bad_holds else "conflict"}
+        for o in occ if o["index"] in clashes
+    ]
+    if conflicts:
+        BOOKING_CONFLICTS.labels("create_bookings_batch").inc(len(conflicts))
+    if conflicts and not payload.allow_partial:
+        db.rollback()
+        raise HTTPException(409, {"message": "Hay horarios ya tomados. No se guardó ninguna reserva.",
+                                  "conflicts": jsonable_encoder(conflicts)})
+    if not accepted:
+        db.rollback()
+        return {"created": [], "conflicts": conflicts}
+
+    # 5) Un solo INSERT multi-fila + un solo commit
+    values, params = values_clause(
+        [
+            (tenant.id, o["item"].service_id, o["item"].staff_id, o["item"].client_name,
+             o["item"].client_phone or "", o["start"], o["end"], o["price"], "confirmed")
+            for o in accepted
+        ],
+        ["integer", "integer", "integer", "text", "text", "timestamptz", "timestamptz", "integer", "text"],
+    )
+    try:
+        rows = db.execute(text(f"""
+            INSERT INTO appointments
+                (tenant_id, service_id, staff_id, customer_name, customer_phone, starts_at, ends_at, price, status)
+            {values}
+            RETURNING id, service_id, staff_id, customer_name AS client_name, customer_phone AS client_phone,
+                      starts_at, ends_at, price, status
+        """), params).mappings().all()
+        # sólo los holds de las reservas que se guardan
+        used_holds = [held[o["index"]] for o in accepted if o["index"] in held]
+        if used_holds:
+            db.execute(text("DELETE FROM slot_holds WHERE id = ANY(:ids)"), {"ids": used_holds})
+        refresh_free_slots(db, [p for o in accepted
+                                for p in affected_days(o["item"].staff_id, o["start"], o["end"],
+                                                       tzs[o["item"].staff_id])], tzs)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        BOOKING_DB_ERRORS.labels("create_bookings_batch").inc()
+        raise HTTPException(500, f"DB error: {e}")
+
+    BOOKINGS_CREATED.labels("batch").inc(len(rows))
+    created = sorted((BookingOut(**r) for r in rows), key=lambda b: b.starts_at)
+    return {"created": created, "conflicts": conflicts}
+
 # --------- Horarios disponibles ----------
 @router.get("/available-slots")
 def get_available_slots(
@@ -102,58 +397,58 @@ def get_available_slots(
     except ValueError:
         raise HTTPException(400, "Formato de fecha inválido. Usa YYYY-MM-DD")
 
-    # 2) bloquear días pasados
-    if day_date < date_cls.today():
-        return []
+    # 2) cache del salón: (staff, día, servicio); se invalida al cambiar reservas/holds del staff
+    tenant = current_tenant()
+    cache_key = (staff_id, day_date, service_id)
+    cached = availability_cache.get(tenant.id, cache_key)
+    if cached is not None:
+        return Response(cached, media_type="application/json")
 
-    # 3) duración del servicio
-    svc = db.execute(
-        text("SELECT duration_minutes FROM services WHERE id = :sid"),
-        {"sid": service_id},
-    ).mappings().first()
+    # 3) duración del servicio y zona horaria del staff, ambos del salón
+    svc = db.execute(text("""
+        SELECT s.duration_minutes, st.timezone
+        FROM services s
+        JOIN staff st ON st.id = :staff_id AND st.tenant_id = s.tenant_id
+        WHERE s.id = :sid AND s.tenant_id = :tenant
+    """), {"sid": service_id, "staff_id": staff_id, "tenant": tenant.id}).mappings().first()
     if not svc:
-        raise HTTPException(404, "Servicio inexistente")
+        raise HTTPException(404, "Servicio o staff inexistente")
     duration = int(svc["duration_minutes"])
-    service_delta = timedelta(minutes=duration)
+    tz_name = svc["timezone"] or APP_TIMEZONE
+
+    # 4) bloquear días pasados (en el calendario del staff)
+    today = datetime.now(zone(tz_name)).date()
+    if day_date < today:
+        return []
+
+    # 5) día local del staff en minutos (tabla de offsets cacheada por zona y día)
+    #    ventana laboral fija: 08:30–18:30 (último turno arranca como mucho 18:30)
+    ld = local_day(tz_name, day_date)
+    work_start, work_end = work_window(ld)
 
-    # 4) ventana laboral fija: 08:30–18:30 (último turno arranca como mucho 18:15)
-    work_start = datetime.combine(day_date, time(8, 30))
-    work_end   = datetime.combine(day_date, time(18, 30))
+    # 6) tramos libres: de la tabla materializada (lookup por índice) o, fuera del horizonte, en vivo
+    runs = load_free_runs(db, staff_id, ld)
+    source = "materialized"
+    if runs is None:
+        runs = compute_free_runs(db, [(staff_id, day_date)], {staff_id: tz_name})[(staff_id, day_date)]
+        source = "live"
 
-    # 5) reservas confirmadas que pisan esa ventana
-    taken = db.execute(text("""
+    # holds vigentes: duran minutos, no se materializan
+    held = db.execute(text("""
         SELECT starts_at, ends_at
-        FROM appointments
+        FROM slot_holds
         WHERE staff_id = :sid
-          AND status = 'confirmed'
+          AND expires_at > now()
           AND starts_at < :work_end
           AND ends_at   > :work_start
-    """), {"sid": staff_id, "work_start": work_start, "work_end": work_end}).mappings().all()
-
-    def to_naive_local(dt: datetime) -> datetime:
-        return dt.astimezone().replace(tzinfo=None) if dt.tzinfo is not None else dt
-
-    taken_ranges = [(to_naive_local(r["starts_at"]), to_naive_local(r["ends_at"])) for r in taken]
-
-    # 6) grilla: cada 15 minutos
-    GRID = timedelta(minutes=15)
-    now = datetime.now()
-    cur = work_start
-
-    # si es hoy, arrancar desde el próximo cuarto de hora
-    if day_date == now.date():
-        cur = max(cur, now.replace(second=0, microsecond=0))
-        mod = cur.minute % 15
-        if mod or cur.second or cur.microsecond:
-            cur = cur.replace(second=0, microsecond=0) + timedelta(minutes=(15 - mod) if mod else 0)
+    """), {"sid": staff_id, "work_start": ld.at(work_start), "work_end": ld.at(work_end)}).mappings().all()
+    taken_ranges = [ld.span(r["starts_at"], r["ends_at"]) for r in held]
 
-    slots: list[str] = []
-    while cur <= work_end:                                 # <= 18:30
-        candidate_end = cur + service_delta                # para chequear solapes con reservas
-        overlap = any(not (candidate_end <= s or e <= cur) for s, e in taken_ranges)
-        if not overlap:
-            slots.append(cur.strftime("%H:%M"))            # incluimos 18:30
-        cur += GRID
+    # 7) grilla cada 15 minutos sobre los tramos libres (minutos enteros)
+    slots = grid_slots(ld, runs, taken_ranges, duration)
 
+    SLOTS_COMPUTED.labels(source).inc(len(slots))
+    if day_date > today:  # los de hoy dependen de la hora: no se cachean
+        availability_cache.put(tenant.id, cache_key, json.dumps(slots, separators=(",", ":")).encode())
     return slots
 
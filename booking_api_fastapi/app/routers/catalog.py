@@ -1,44 +1,59 @@
 from fastapi import APIRouter, Depends
+from fastapi.responses import Response
 from sqlalchemy.orm import Session
 from app.db import get_db
 from app.models import Service, Staff
+from app.profiling import ProfiledRoute
+from app.tenancy import catalog_cache, current_tenant
+from app.utils.responses import json_bytes
 
-router = APIRouter(tags=["catalog"])
+router = APIRouter(tags=["catalog"], route_class=ProfiledRoute)
 
 @router.get("/services")
 def list_services(db: Session = Depends(get_db)):
-    rows = (
-        db.query(Service)
-        .order_by(Service.category, Service.name)
-        .all()
-    )
-    return [
-        {
-            "id": s.id,
-            "category": s.category,
-            "name": s.name,
-            "description": s.description,
-            "price": s.price,
-            "duration_minutes": s.duration_minutes,
-        }
-        for s in rows
-    ]
+    tenant = current_tenant()
+    body = catalog_cache.get(tenant.id, "services")
+    if body is None:
+        rows = (
+            db.query(Service)
+            .filter(Service.tenant_id == tenant.id)
+            .order_by(Service.category, Service.name)
+            .all()
+        )
+        body = json_bytes([
+            {
+                "id": s.id,
+                "category": s.category,
+                "name": s.name,
+                "description": s.description,
+                "price": s.price,
+                "duration_minutes": s.duration_minutes,
+            }
+            for s in rows
+        ])
+        catalog_cache.put(tenant.id, "services", body)
+    return Response(body, media_type="application/json")
 
 @router.get("/staff")
 def list_staff(db: Session = Depends(get_db)):
-    rows = (
-        db.query(Staff)
-        .filter(Staff.active == True)
-        .order_by(Staff.full_name)
-        .all()
-    )
-    return [
-        {
-            "id": x.id,
-            "full_name": x.full_name,
-            "phone": x.phone,
-            "active": x.active,
-            "timezone": x.timezone,
-        }
-        for x in rows
-    ]
+    tenant = current_tenant()
+    body = catalog_cache.get(tenant.id, "staff")
+    if body is None:
+        rows = (
+            db.query(Staff)
+            .filter(Staff.tenant_id == tenant.id, Staff.active == True)
+            .order_by(Staff.full_name)
+            .all()
+        )
+        body = json_bytes([
+            {
+                "id": x.id,
+                "full_name": x.full_name,
+                "phone": x.phone,
+                "active": x.active,
+                "timezone": x.timezone,
+            }
+            for x in rows
+        ])
+        catalog_cache.put(tenant.id, "staff", body)
+    return Response(body, media_type="application/json")
@@ -0,0 +1,120 @@
+# app/routers/holds.py
+import secrets
+from datetime import datetime, timedelta
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, Field
+from sqlalchemy import text
+
+from app.config import APP_TIMEZONE, SLOT_HOLD_TTL_SEC
+from app.db import get_db
+from app.metrics import BOOKING_CONFLICTS
+from app.profiling import ProfiledRoute
+from app.tenancy import current_tenant, invalidate_availability
+from app.utils.time import local_to_utc
+
+router = APIRouter(prefix="/bookings/holds", tags=["bookings"], route_class=ProfiledRoute)
+
+# Máximo de holds vencidos que se borran por request (barrido incremental)
+SWEEP_BATCH = 500
+
+class HoldIn(BaseModel):
+    service_id: int
+    staff_id: int
+    starts_at: datetime
+    ttl_seconds: int | None = Field(None, ge=30, le=1800)
+
+class HoldOut(BaseModel):
+    token: str
+    staff_id: int
+    service_id: int
+    starts_at: datetime
+    ends_at: datetime
+    expires_at: datetime
+
+def sweep_expired_holds(db) -> int:
+    """Borra un lote de holds vencidos. Los vencidos ya se ignoran en las lecturas (expiración lazy)."""
+    res = db.execute(text("""
+        DELETE FROM slot_holds
+        WHERE id IN (
+            SELECT id FROM slot_holds
+            WHERE expires_at <= now()
+            LIMIT :n
+        )
+    """), {"n": SWEEP_BATCH})
+    return res.rowcount or 0
+
+def lock_staff(db, staff_id: int) -> None:
+    # Serializa holds/reservas del mismo staff hasta el fin de la transacción
+    db.execute(text("SELECT pg_advisory_xact_lock(:sid)"), {"sid": staff_id})
+
+@router.post("", response_model=HoldOut, status_code=201)
+def create_hold(payload: HoldIn, db=Depends(get_db)):
+    svc = db.execute(text("""
+        SELECT s.duration_minutes, st.timezone
+        FROM services s
+        JOIN staff st ON st.id = :staff_id AND st.tenant_id = s.tenant_id
+        WHERE s.id = :sid AND s.tenant_id = :tenant
+    """), {"sid": payload.service_id, "staff_id": payload.staff_id,
+           "tenant": current_tenant().id}).mappings().first()
+    if not svc:
+        raise HTTPException(400, "Servicio o staff inexistente")
+    # sin offset = hora de reloj del staff, igual que POST /bookings
+    start = local_to_utc(payload.starts_at, svc["timezone"] or APP_TIMEZONE)
+    ends_at = start + timedelta(minutes=int(svc["duration_minutes"]))
+    ttl = payload.ttl_seconds or SLOT_HOLD_TTL_SEC
+
+    try:
+        lock_staff(db, payload.staff_id)
+        sweep_expired_holds(db)
+
+        # Ocupado si hay una reserva confirmada o un hold vigente que se solape
+        clash = db.execute(text("""
+            SELECT 1
+            FROM appointments
+            WHERE staff_id = :staff_id
+              AND status = 'confirmed'
+              AND NOT (:end <= starts_at OR :start >= ends_at)
+            UNION ALL
+            SELECT 1
+            FROM slot_holds
+            WHERE staff_id = :staff_id
+              AND expires_at > now()
+              AND NOT (:end <= starts_at OR :start >= ends_at)
+            LIMIT 1
+        """), {"staff_id": payload.staff_id, "start": start, "end": ends_at}).first()
+        if clash:
+            db.rollback()
+            BOOKING_CONFLICTS.labels("create_hold").inc()
+            raise HTTPException(409, "Ese horario ya fue tomado. Elegí otro.")
+
+        row = db.execute(text("""
+            INSERT INTO slot_holds (token, staff_id, service_id, starts_at, ends_at, expires_at)
+            VALUES (:token, :staff_id, :service_id, :start, :end, now() + make_interval(secs => :ttl))
+            RETURNING token, staff_id, service_id, starts_at, ends_at, expires_at
+        """), {
+            "token": secrets.token_urlsafe(16),
+            "staff_id": payload.staff_id,
+            "service_id": payload.service_id,
+            "start": start,
+            "end": ends_at,
+            "ttl": ttl,
+        }).mappings().first()
+        invalidate_availability(db, [payload.staff_id])
+        db.commit()
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(500, f"DB error: {e}")
+
+    return row
+
+@router.delete("/{token}")
+def release_hold(token: str, db=Depends(get_db)):
+    staff_ids = db.execute(text("""
+        DELETE FROM slot_holds WHERE token = :token RETURNING staff_id
+    """), {"token": token}).scalars().all()
+    invalidate_availability(db, staff_ids)
+    db.commit()
+    return {"ok": True, "released": bool(staff_ids)}
@@ -0,0 +1,155 @@
+# booking_api_fastapi/app/schema.py
+"""
+Esquema de la DB, fuera del import de la app.
+
+    python -m app.schema
+
+Es el paso de deploy/migración (el comando de arranque de nixpacks.toml lo corre antes
+de uvicorn; en local, antes de levantar la app): crea tablas que falten y además actualiza tablas
+existentes (columna tenant_id, índices nuevos, únicos que ya no van). Los índices se
+crean con CREATE INDEX CONCURRENTLY, sin bloquear escrituras; un ALTER TABLE sólo se
+hace si a la tabla le falta la columna, y con lock_timeout para no quedar en cola
+detrás de queries largas.
+
+Al arrancar la app (AUTO_CREATE_SCHEMA=true) sólo corre `create_schema()`: create_all()
+de tablas nuevas y el tenant por defecto, nada que tome locks sobre tablas existentes.
+Si una tabla existente no está migrada la app no queda ready hasta correr este paso.
+"""
+from __future__ import annotations
+
+import re
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateIndex, Index
+
+from app.config import DEFAULT_TENANT_ID
+from app.db import Base, require_engine
+
+TENANT_TABLES = ["services", "staff", "staff_schedules", "blackouts", "appointments"]
+
+# Únicos que ya no van: los de antes del multi-tenant impedirían repetir nombres entre
+# salones, y el nombre del staff no es único (dos personas pueden llamarse igual)
+LEGACY_INDEXES = ["ux_services_category_name", "ux_staff_full_name", "ux_staff_tenant_full_name"]
+
+ALTER_LOCK_TIMEOUT = "5s"
+
+
+def _ensure_default_tenant(conn: Connection) -> None:
+    conn.execute(text("""
+        INSERT INTO tenants (id, slug, name) VALUES (:id, 'default', 'Default')
+        ON CONFLICT (id) DO NOTHING
+    """), {"id": DEFAULT_TENANT_ID})
+    conn.execute(text("""
+        SELECT setval(pg_get_serial_sequence('tenants', 'id'), (SELECT max(id) FROM tenants))
+    """))
+
+
+def pending_upgrade(conn: Connection) -> list[str]:
+    """Tablas existentes a las que les falta tenant_id (hay que correr `python -m app.schema`)."""
+    have = set(conn.execute(text("""
+        SELECT table_name
+        FROM information_schema.columns
+        WHERE table_schema = current_schema() AND column_name = 'tenant_id' AND table_name = ANY(:t)
+    """), {"t": TENANT_TABLES}).scalars())
+    exist = set(conn.execute(text("""
+        SELECT table_name
+        FROM information_schema.tables
+        WHERE table_schema = current_schema() AND table_name = ANY(:t)
+    """), {"t": TENANT_TABLES}).scalars())
+    return [t for t in TENANT_TABLES if t in exist and t not in have]
+
+
+def create_schema() -> None:
+    """Arranque: tablas nuevas + tenant por defecto. No toca tablas existentes."""
+    import app.models  # noqa: F401  registra los modelos en Base.metadata
+
+    with require_engine().begin() as conn:
+        Base.metadata.create_all(bind=conn)
+        _ensure_default_tenant(conn)
+
+
+def _index_state(conn: Connection, name: str) -> bool | None:
+    """True si el índice existe y es válido, False si quedó inválido (CONCURRENTLY fallido), None si no existe."""
+    return conn.execute(text("""
+        SELECT i.indisvalid
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = :name AND c.relnamespace = current_schema()::regnamespace
+    """), {"name": name}).scalar()
+
+
+def _create_concurrently(conn: Connection, index: Index) -> None:
+    ddl = str(CreateIndex(index).compile(dialect=conn.dialect))
+    conn.execute(text(re.sub(r"^CREATE (UNIQUE )?INDEX ", r"CREATE \1INDEX CONCURRENTLY ", ddl)))
+
+
+def upgrade_schema() -> list[str]:
+    """
+    Migración explícita e idempotente. Devuelve los índices que no se pudieron crear
+    (ej: un único con datos duplicados): se informan y se sigue con el resto.
+    Corre en el arranque de cada instancia (ver nixpacks.toml): un advisory lock de
+    sesión hace que, si arrancan varias a la vez, la migren de a una.
+    """
+    import app.models  # noqa: F401
+
+    engine = require_engine()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as guard:
+        guard.execute(text("SELECT pg_advisory_lock(hashtext('app.schema'), 0)"))
+        try:
+            return _upgrade(engine)
+        finally:
+            guard.execute(text("SELECT pg_advisory_unlock(hashtext('app.schema'), 0)"))
+
+
+def _upgrade(engine) -> list[str]:
+    with engine.begin() as conn:
+        Base.metadata.create_all(bind=conn)
+        _ensure_default_tenant(conn)
+        missing = pending_upgrade(conn)
+        if missing:
+            conn.execute(text(f"SET LOCAL lock_timeout = '{ALTER_LOCK_TIMEOUT}'"))
+        for table in missing:
+            # default constante: no reescribe la tabla (PG 11+), el lock dura lo que el catálogo
+            conn.execute(text(f"""
+                ALTER TABLE {table}
+                ADD COLUMN tenant_id integer NOT NULL
+                DEFAULT {DEFAULT_TENANT_ID} REFERENCES tenants (id) ON DELETE RESTRICT
+            """))
+            print(f"  + {table}.tenant_id")
+
+    failed: list[str] = []
+    # CONCURRENTLY no puede ir dentro de una transacción
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for name in LEGACY_INDEXES:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                state = _index_state(conn, index.name)
+                if state:
+                    continue
+                if state is False:
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index.name}"))
+                try:
+                    _create_concurrently(conn, index)
+                    print(f"  + índice {index.name}")
+                except DBAPIError as e:
+                    # un CONCURRENTLY fallido deja el índice inválido: se borra
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index.name}"))
+                    failed.append(f"{index.name}: {e.orig}".strip())
+    return failed
+
+
+def main() -> None:
+    failed = upgrade_schema()
+    if failed:
+        print("❌ Índices que no se pudieron crear (revisar datos y volver a correr):")
+        for line in failed:
+            print("  -", line)
+        raise SystemExit(1)
+    print("✅ Esquema OK.")
+
+
+if __name__ == "__main__":
+    main()
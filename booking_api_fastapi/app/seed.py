@@ -2,86 +2,83 @@
 from __future__ import annotations
 
 from datetime import time
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
-from app.db import SessionLocal
+from app.config import DEFAULT_TENANT_ID
+from app.db import SessionLocal, require_engine
 from app.models import Service, Staff, StaffSchedule
 
 
-def ensure_service(db: Session, *, category: str, name: str, description: str, price: int, duration_minutes: int):
-    exists = (
-        db.query(Service)
-        .filter(Service.category == category, Service.name == name)
-        .first()
-    )
-    if exists:
+def ensure_unique_indexes(db: Session) -> None:
+    """
+    Chequea (sin DDL) que estén los únicos que usan los ON CONFLICT de abajo. En tablas
+    creadas antes de tenerlos en models.py create_all() no los agrega: los crea
+    `python -m app.schema` (CONCURRENTLY), no el seed.
+    """
+    needed = ["ux_services_tenant_category_name", "ux_staff_schedules_slot"]
+    have = set(db.execute(text("""
+        SELECT c.relname
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = ANY(:names) AND i.indisvalid
+    """), {"names": needed}).scalars())
+    missing = [n for n in needed if n not in have]
+    if missing:
+        raise RuntimeError(f"Faltan los índices {missing}: correr `python -m app.schema` antes del seed")
+
+
+def upsert_services(db: Session, rows: list[dict]) -> None:
+    """Un solo INSERT multi-fila; los (tenant_id, category, name) existentes no se tocan."""
+    if not rows:
         return
-
-    service = Service(
-        category=category,
-        name=name,
-        description=description,
-        price=price,
-        duration_minutes=duration_minutes,
-    )
-    db.add(service)
-    db.flush()  # ✅ fuerza INSERT ahora y obtiene id si hace falta
-
-
-def ensure_staff(db: Session, *, full_name: str, phone: str | None, active: bool = True, timezone: str = "America/Asuncion") -> Staff:
-    staff = db.query(Staff).filter(Staff.full_name == full_name).first()
-    if staff:
-        # Si querés que actualice teléfono/activo en cada seed, descomentá:
-        # staff.phone = phone
-        # staff.active = active
-        # staff.timezone = timezone
-        return staff
-
-    staff = Staff(
-        full_name=full_name,
-        phone=phone,
-        active=active,
-        timezone=timezone,
-    )
-    db.add(staff)
-    db.flush()  # obtiene staff.id sin commit
-    return staff
-
-
-def ensure_schedule(
-    db: Session,
-    *,
-    staff_id: int,
-    day_of_week: int,
-    start_time: time,
-    end_time: time,
-    break_minutes: int = 0,
-) -> None:
-    exists = (
-        db.query(StaffSchedule)
-        .filter(
-            StaffSchedule.staff_id == staff_id,
-            StaffSchedule.day_of_week == day_of_week,
-            StaffSchedule.start_time == start_time,
-            StaffSchedule.end_time == end_time,
-        )
-        .first()
+    db.execute(
+        pg_insert(Service)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=["tenant_id", "category", "name"])
     )
-    if exists:
-        return
 
-    db.add(
-        StaffSchedule(
-            staff_id=staff_id,
-            day_of_week=day_of_week,
-            start_time=start_time,
-            end_time=end_time,
-            break_minutes=break_minutes,
-        )
+
+def upsert_staff(db: Session, rows: list[dict]) -> dict[str, int]:
+    """
+    Inserta el staff que falte (por nombre dentro del tenant) y devuelve {full_name: id} de todos.
+    Todas las filas son del mismo tenant. El nombre no es único en la tabla (puede haber
+    dos personas con el mismo nombre): se leen los existentes en una query y se insertan
+    los que faltan en otra. Si ya hay varios con el mismo nombre se usa el de menor id.
+    """
+    if not rows:
+        return {}
+    tenant_id = rows[0]["tenant_id"]
+    # dos seeds a la vez del mismo tenant no duplican staff (lock hasta el commit)
+    db.execute(text("SELECT pg_advisory_xact_lock(hashtext('seed_staff'), :tenant)"), {"tenant": tenant_id})
+    names = [r["full_name"] for r in rows]
+    ids = dict(db.execute(text("""
+        SELECT full_name, min(id)
+        FROM staff
+        WHERE tenant_id = :tenant AND full_name = ANY(:names)
+        GROUP BY full_name
+    """), {"tenant": tenant_id, "names": names}).all())
+    missing = list({r["full_name"]: r for r in rows if r["full_name"] not in ids}.values())
+    if missing:
+        ids.update(db.execute(
+            pg_insert(Staff).values(missing).returning(Staff.full_name, Staff.id)
+        ).all())
+    return ids
+
+
+def upsert_schedules(db: Session, rows: list[dict]) -> None:
+    if not rows:
+        return
+    db.execute(
+        pg_insert(StaffSchedule)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=["staff_id", "day_of_week", "start_time", "end_time"])
     )
 
 
-def main() -> None:
+def main(tenant_id: int = DEFAULT_TENANT_ID) -> None:
+    require_engine()
     db = SessionLocal()
     try:
         # =========================
@@ -120,8 +117,12 @@ def main() -> None:
             ("Depilación Láser", "Depilación láser - Zona grande", "Piernas completas/espalda (según disponibilidad).", 350000, 60),
         ]
 
-        for cat, name, desc, price, dur in services:
-            ensure_service(db, category=cat, name=name, description=desc, price=price, duration_minutes=dur)
+        ensure_unique_indexes(db)
+        upsert_services(db, [
+            {"tenant_id": tenant_id, "category": cat, "name": name, "description": desc, "price": price,
+             "duration_minutes": dur}
+            for cat, name, desc, price, dur in services
+        ])
 
         # =========================
         # 2) STAFF (EDITÁ NOMBRES Y TELÉFONOS)
@@ -133,36 +134,39 @@ def main() -> None:
             ("Staff 2", None, True),
         ]
 
-        staff_objs: list[Staff] = []
-        for full_name, phone, active in staff_list:
-            staff_objs.append(ensure_staff(db, full_name=full_name, phone=phone, active=active))
+        staff_ids = upsert_staff(db, [
+            {"tenant_id": tenant_id, "full_name": full_name, "phone": phone, "active": active,
+             "timezone": "America/Asuncion"}
+            for full_name, phone, active in staff_list
+        ])
 
-        
         # =========================
         # 3) HORARIOS (0=Dom ... 6=Sáb)
         # =========================
         # Lunes a Viernes: 09:00-18:00 con break 60
         # Sábado: 09:00-13:00 sin break
-        for st in staff_objs:
+        schedules: list[dict] = []
+        for staff_id in staff_ids.values():
             # Lun(1) a Vie(5)
             for dow in range(1, 6):
-                ensure_schedule(
-                    db,
-                    staff_id=st.id,
-                    day_of_week=dow,
-                    start_time=time(9, 0),
-                    end_time=time(18, 0),
-                    break_minutes=60,
-                )
+                schedules.append({
+                    "tenant_id": tenant_id,
+                    "staff_id": staff_id,
+                    "day_of_week": dow,
+                    "start_time": time(9, 0),
+                    "end_time": time(18, 0),
+                    "break_minutes": 60,
+                })
             # Sáb(6)
-            ensure_schedule(
-                db,
-                staff_id=st.id,
-                day_of_week=6,
-                start_time=time(9, 0),
-                end_time=time(13, 0),
-                break_minutes=0,
-            )
+            schedules.append({
+                "tenant_id": tenant_id,
+                "staff_id": staff_id,
+                "day_of_week": 6,
+                "start_time": time(9, 0),
+                "end_time": time(13, 0),
+                "break_minutes": 0,
+            })
+        upsert_schedules(db, schedules)
 
         db.commit()
         print("✅ Seed OK: services + staff + schedules listos.")
@@ -0,0 +1,305 @@
+# booking_api_fastapi/app/tenancy.py
+"""
+Multi-tenant: varios salones en un mismo deploy.
+
+- El tenant sale del header `X-Tenant: <slug>` (TENANT_HEADER) o del subdominio
+  `<slug>.TENANT_BASE_DOMAIN`. Con MULTI_TENANT=false todo va al tenant por defecto.
+- TenantMiddleware lo deja en el ContextVar `current_tenant`; las queries filtran
+  por `tenant_id` (índices que empiezan por tenant_id, ver models.py).
+- Cupo de sesiones de DB por tenant y proceso (`session_slot`, lo usa get_db):
+  un salón con mucho tráfico espera o recibe 503, los demás no se quedan sin pool.
+- Caches por tenant con tope de memoria (`TenantCache`): catálogo y horarios.
+
+    python -m app.tenancy add centro "Peluquería Centro" --admin-token ...
+    python -m app.tenancy list
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Hashable, Iterable
+
+from fastapi import HTTPException
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.config import (
+    AVAILABILITY_CACHE_TTL_SEC, CACHE_MAX_BYTES, CATALOG_CACHE_TTL_SEC, DEFAULT_TENANT_ID, MULTI_TENANT,
+    TENANT_BASE_DOMAIN, TENANT_CACHE_MAX_BYTES, TENANT_DB_MAX_CONNECTIONS, TENANT_DB_WAIT_SEC, TENANT_HEADER,
+)
+from app.metrics import CACHE_BYTES, CACHE_REQUESTS, TENANT_DB_REJECTED
+
+
+@dataclass(frozen=True)
+class Tenant:
+    id: int
+    slug: str
+    name: str
+    admin_token: str | None = field(default=None, repr=False)
+
+
+DEFAULT_TENANT = Tenant(DEFAULT_TENANT_ID, "default", "Default")
+
+# Lo setea TenantMiddleware; fuera de un request (CLI, jobs) vale el tenant por defecto
+_current: ContextVar[Tenant | None] = ContextVar("current_tenant", default=None)
+
+
+def current_tenant() -> Tenant:
+    return _current.get() or DEFAULT_TENANT
+
+
+# ---------- Directorio slug → tenant ----------
+class TenantDirectory:
+    """Todos los tenants activos en memoria; se recargan como mucho cada `refresh_sec`."""
+
+    def __init__(self, refresh_sec: float = 30) -> None:
+        self.refresh_sec = refresh_sec
+        self._by_slug: dict[str, Tenant] = {}
+        self._loaded_at = float("-inf")
+
+    def peek(self, slug: str) -> tuple[Tenant | None, bool]:
+        """(tenant o None, si el directorio está fresco)."""
+        fresh = time.monotonic() - self._loaded_at < self.refresh_sec
+        return self._by_slug.get(slug), fresh
+
+    def reload(self) -> None:
+        from app.db import SessionLocal, require_engine
+
+        require_engine()
+        with SessionLocal() as db:
+            rows = db.execute(text("""
+                SELECT id, slug, name, admin_token FROM tenants WHERE active = true
+            """)).all()
+        self._by_slug = {r.slug: Tenant(r.id, r.slug, r.name, r.admin_token) for r in rows}
+        self._loaded_at = time.monotonic()
+
+
+directory = TenantDirectory()
+
+# rutas que no dependen del salón
+PUBLIC_PATHS = {"/healthz", "/livez", "/readyz", "/metrics", "/docs", "/docs/oauth2-redirect", "/redoc",
+                "/openapi.json"}
+
+
+def _tenant_slug(scope: Scope) -> str | None:
+    header = TENANT_HEADER.lower().encode("latin-1")
+    host = None
+    for k, v in scope["headers"]:
+        if k == header:
+            return v.decode("latin-1").strip().lower() or None
+        if k == b"host":
+            host = v.decode("latin-1").split(":")[0].lower()
+    suffix = "." + TENANT_BASE_DOMAIN.lower()
+    if TENANT_BASE_DOMAIN and host and host.endswith(suffix):
+        sub = host[: -len(suffix)]
+        if sub and "." not in sub:
+            return sub
+    return None
+
+
+class TenantMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in PUBLIC_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        tenant = DEFAULT_TENANT
+        if MULTI_TENANT:
+            slug = _tenant_slug(scope)
+            if slug is None:
+                await JSONResponse(
+                    {"detail": f"Falta el salón: header {TENANT_HEADER} o subdominio"}, status_code=400,
+                )(scope, receive, send)
+                return
+            found, fresh = directory.peek(slug)
+            if not fresh:
+                try:
+                    await asyncio.to_thread(directory.reload)
+                except Exception as e:
+                    await JSONResponse({"detail": f"No se pudo leer tenants: {e}"}, status_code=503)(
+                        scope, receive, send)
+                    return
+                found, _ = directory.peek(slug)
+            if found is None:
+                await JSONResponse({"detail": "Salón inexistente"}, status_code=404)(scope, receive, send)
+                return
+            tenant = found
+
+        token = _current.set(tenant)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current.reset(token)
+
+
+# ---------- Cupo de sesiones de DB por tenant ----------
+_slots: dict[int, asyncio.Semaphore] = {}
+
+
+@asynccontextmanager
+async def session_slot():
+    """
+    Espera un lugar del cupo del tenant (sin ocupar un hilo del threadpool mientras
+    espera). Con MULTI_TENANT=false no limita nada.
+    """
+    if not MULTI_TENANT:
+        yield
+        return
+    tenant = current_tenant()
+    sem = _slots.setdefault(tenant.id, asyncio.Semaphore(TENANT_DB_MAX_CONNECTIONS))
+    try:
+        await asyncio.wait_for(sem.acquire(), TENANT_DB_WAIT_SEC)
+    except asyncio.TimeoutError:
+        TENANT_DB_REJECTED.labels(tenant.slug).inc()
+        raise HTTPException(503, "El salón tiene demasiadas consultas en curso. Reintentá en unos segundos.",
+                            headers={"Retry-After": "1"})
+    try:
+        yield
+    finally:
+        sem.release()
+
+
+# ---------- Caches por tenant ----------
+ENTRY_OVERHEAD = 200  # bytes aprox. de clave + tupla + nodo del dict, además del valor
+
+
+class TenantCache:
+    """
+    LRU de respuestas ya serializadas (bytes) separado por tenant, con TTL y con tope
+    de memoria por tenant (un salón no desaloja a los demás) y total. Thread-safe:
+    los endpoints sync corren en el threadpool.
+    """
+
+    def __init__(self, name: str, ttl: float, tenant_max_bytes: int = TENANT_CACHE_MAX_BYTES,
+                 max_bytes: int = CACHE_MAX_BYTES) -> None:
+        self.name = name
+        self.ttl = ttl
+        self.tenant_max_bytes = tenant_max_bytes
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._tenants: OrderedDict[int, OrderedDict[Hashable, tuple[float, bytes]]] = OrderedDict()
+        self._sizes: dict[int, int] = {}
+        self._total = 0
+
+    def get(self, tenant_id: int, key: Hashable) -> bytes | None:
+        if self.ttl <= 0:  # apagada
+            return None
+        with self._lock:
+            entries = self._tenants.get(tenant_id)
+            hit = entries.get(key) if entries else None
+            if hit and hit[0] > time.monotonic():
+                entries.move_to_end(key)
+                self._tenants.move_to_end(tenant_id)
+                CACHE_REQUESTS.labels(self.name, "hit").inc()
+                return hit[1]
+            if hit:
+                self._drop(tenant_id, key)
+        CACHE_REQUESTS.labels(self.name, "miss").inc()
+        return None
+
+    def put(self, tenant_id: int, key: Hashable, value: bytes) -> None:
+        size = len(value) + ENTRY_OVERHEAD
+        if self.ttl <= 0 or size > self.tenant_max_bytes:
+            return
+        with self._lock:
+            entries = self._tenants.setdefault(tenant_id, OrderedDict())
+            self._tenants.move_to_end(tenant_id)
+            if key in entries:
+                self._drop(tenant_id, key)
+                entries = self._tenants.setdefault(tenant_id, OrderedDict())
+            entries[key] = (time.monotonic() + self.ttl, value)
+            self._sizes[tenant_id] = self._sizes.get(tenant_id, 0) + size
+            self._total += size
+
+            while self._sizes.get(tenant_id, 0) > self.tenant_max_bytes:
+                self._drop(tenant_id, next(iter(self._tenants[tenant_id])))
+            while self._total > self.max_bytes:
+                lru = next(iter(self._tenants))                     # tenant usado hace más tiempo
+                self._drop(lru, next(iter(self._tenants[lru])))
+            CACHE_BYTES.labels(self.name).set(self._total)
+
+    def invalidate(self, tenant_id: int, match: Callable[[Hashable], bool] | None = None) -> None:
+        with self._lock:
+            entries = self._tenants.get(tenant_id)
+            if not entries:
+                return
+            for key in [k for k in entries if match is None or match(k)]:
+                self._drop(tenant_id, key)
+            CACHE_BYTES.labels(self.name).set(self._total)
+
+    def _drop(self, tenant_id: int, key: Hashable) -> None:
+        entries = self._tenants[tenant_id]
+        size = len(entries.pop(key)[1]) + ENTRY_OVERHEAD
+        self._sizes[tenant_id] -= size
+        self._total -= size
+        if not entries:
+            del self._tenants[tenant_id]
+            del self._sizes[tenant_id]
+
+
+# /services y /staff
+catalog_cache = TenantCache("catalog", CATALOG_CACHE_TTL_SEC)
+# /bookings/available-slots, clave (staff_id, día, service_id)
+availability_cache = TenantCache("availability", AVAILABILITY_CACHE_TTL_SEC)
+
+
+def invalidate_availability(db: Session, staff_ids: Iterable[int]) -> None:
+    """Borra los horarios cacheados de esos staff cuando la transacción haga commit."""
+    stale = db.info.setdefault("availability_stale", set())
+    stale.update((current_tenant().id, sid) for sid in staff_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session: Session) -> None:
+    by_tenant: dict[int, set[int]] = {}
+    for tenant_id, sid in session.info.pop("availability_stale", ()):
+        by_tenant.setdefault(tenant_id, set()).add(sid)
+    for tenant_id, sids in by_tenant.items():
+        availability_cache.invalidate(tenant_id, lambda key: key[0] in sids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session: Session) -> None:
+    session.info.pop("availability_stale", None)
+
+
+# ---------- CLI ----------
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Alta y listado de salones (tenants)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    add = sub.add_parser("add", help="crear un salón")
+    add.add_argument("slug", help="subdominio / valor del header X-Tenant")
+    add.add_argument("name")
+    add.add_argument("--admin-token", default=None, help="token de /admin propio (default: ADMIN_TOKEN)")
+    sub.add_parser("list", help="listar salones")
+    args = ap.parse_args()
+
+    from app.db import SessionLocal, require_engine
+
+    require_engine()
+    with SessionLocal() as db:
+        if args.cmd == "add":
+            tenant_id = db.execute(text("""
+                INSERT INTO tenants (slug, name, admin_token) VALUES (:slug, :name, :token)
+                RETURNING id
+            """), {"slug": args.slug.lower(), "name": args.name, "token": args.admin_token}).scalar_one()
+            db.commit()
+            print(f"✅ Salón {args.slug} creado (tenant_id={tenant_id}).")
+        else:
+            for r in db.execute(text("SELECT id, slug, name, active FROM tenants ORDER BY id")):
+                print(f"{r.id:>4}  {r.slug:20} {r.name}{'' if r.active else '  (inactivo)'}")
+
+
+if __name__ == "__main__":
+    main()
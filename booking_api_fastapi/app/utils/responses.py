@@ -0,0 +1,40 @@
+# app/utils/responses.py
+from __future__ import annotations
+import json
+from datetime import date, datetime, time
+from typing import Any, Iterable
+
+from fastapi import HTTPException
+from starlette.responses import Response
+
+
+def _default(o: Any) -> Any:
+    # mismo formato que jsonable_encoder de FastAPI
+    if isinstance(o, (datetime, date, time)):
+        return o.isoformat()
+    raise TypeError(f"{type(o).__name__} no es serializable a JSON")
+
+
+def json_bytes(data: Any) -> bytes:
+    """JSON compacto, como JSONResponse, pero sin pasar por jsonable_encoder (listas grandes)."""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=_default).encode()
+
+
+def json_response(data: Any) -> Response:
+    return Response(json_bytes(data), media_type="application/json")
+
+
+def parse_fields(raw: str | None, allowed: Iterable[str], always: Iterable[str] = ()) -> list[str] | None:
+    """
+    `fields=id,start_utc,staff_id` → lista de campos en el orden de `allowed`
+    (más los de `always`). None si no se pidió nada (= todos). 400 si hay campos desconocidos.
+    """
+    if raw is None or not raw.strip():
+        return None
+    allowed = list(allowed)
+    wanted = {f.strip() for f in raw.split(",") if f.strip()}
+    bad = sorted(wanted - set(allowed))
+    if bad:
+        raise HTTPException(400, f"Campos inválidos: {bad}. Válidos: {allowed}")
+    wanted.update(always)
+    return [f for f in allowed if f in wanted]
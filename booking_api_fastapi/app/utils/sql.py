@@ -0,0 +1,27 @@
+# app/utils/sql.py
+from __future__ import annotations
+from typing import Any, Iterable, Sequence
+
+
+def values_clause(
+    rows: Iterable[Sequence[Any]],
+    types: Sequence[str],
+    prefix: str = "v",
+) -> tuple[str, dict[str, Any]]:
+    """
+    Arma un `VALUES (...), (...)` con parámetros nombrados para usar con text().
+    Cada columna lleva CAST explícito para que Postgres tipifique bien los NULL.
+
+        sql, params = values_clause([(1, dt)], ["integer", "timestamp"])
+        -> "VALUES (CAST(:v_0_0 AS integer), CAST(:v_0_1 AS timestamp))", {...}
+    """
+    tuples: list[str] = []
+    params: dict[str, Any] = {}
+    for i, row in enumerate(rows):
+        cells = []
+        for j, (value, sql_type) in enumerate(zip(row, types)):
+            name = f"{prefix}_{i}_{j}"
+            cells.append(f"CAST(:{name} AS {sql_type})")
+            params[name] = value
+        tuples.append(f"({', '.join(cells)})")
+    return "VALUES " + ", ".join(tuples), params
@@ -1,8 +1,14 @@
 # app/utils/time.py
 from __future__ import annotations
+from dataclasses import dataclass
 from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
 from zoneinfo import ZoneInfo
 
+@lru_cache(maxsize=None)
+def zone(tz_name: str) -> ZoneInfo:
+    return ZoneInfo(tz_name)
+
 # ---- helpers básicos de parseo ----
 def _ensure_date(d: date | str) -> date:
     if isinstance(d, date):
@@ -29,7 +35,7 @@ def local_date_bounds_utc(day: date | str, tz_name: str) -> tuple[datetime, date
     end   = YYYY-MM-DD 00:00:00 del día siguiente local
     """
     d = _ensure_date(day)
-    tz = ZoneInfo(tz_name)
+    tz = zone(tz_name)
 
     start_local = datetime(d.year, d.month, d.day, 0, 0, 0, tzinfo=tz)
     end_local = start_local + timedelta(days=1)
@@ -41,17 +47,17 @@ def local_date_bounds_utc(day: date | str, tz_name: str) -> tuple[datetime, date
 def combine_date_time_local(day: date | str, hhmm: time | str, tz_name: str) -> datetime:
     d = _ensure_date(day)
     t = _ensure_time(hhmm)
-    tz = ZoneInfo(tz_name)
+    tz = zone(tz_name)
     return datetime(d.year, d.month, d.day, t.hour, t.minute, t.second, tzinfo=tz)
 
 def utc_to_local(dt_utc: datetime, tz_name: str) -> datetime:
     if dt_utc.tzinfo is None:
         dt_utc = dt_utc.replace(tzinfo=timezone.utc)
-    return dt_utc.astimezone(ZoneInfo(tz_name))
+    return dt_utc.astimezone(zone(tz_name))
 
 def local_to_utc(dt_local: datetime, tz_name: str) -> datetime:
     if dt_local.tzinfo is None:
-        dt_local = dt_local.replace(tzinfo=ZoneInfo(tz_name))
+        dt_local = dt_local.replace(tzinfo=zone(tz_name))
     return dt_local.astimezone(timezone.utc)
 
 # ---- iterador de rangos ----
@@ -62,11 +68,114 @@ def iter_range(start: datetime, end: datetime, step_minutes: int):
     while cur < end:
         yield cur
         cur = cur + delta
-        
+
 def parse_local_datetime(s: str, tz_name: str) -> datetime:
     """
     Convierte un string 'YYYY-MM-DD HH:MM' en datetime con zona horaria local.
     """
     d = datetime.strptime(s, "%Y-%m-%d %H:%M")
-    tz = ZoneInfo(tz_name)
-    return d.replace(tzinfo=tz)
\ No newline at end of file
+    tz = zone(tz_name)
+    return d.replace(tzinfo=tz)
+
+# ---- día local en minutos enteros (tabla de offsets por zona y día) ----
+@dataclass(frozen=True)
+class LocalDay:
+    """
+    Un día local de una zona medido en minutos transcurridos desde su primer
+    instante (`start_utc`). Un día con cambio de horario dura 1380 o 1500 minutos;
+    `offsets` guarda (minuto desde el que rige, offset UTC en minutos).
+    Los loops de horarios trabajan con ints y sólo se traduce a reloj al final.
+    """
+    tz_name: str
+    day: date
+    start_utc: datetime
+    minutes: int
+    start_wall: int                       # hora de reloj del primer instante (60 si las 00:00 no existen)
+    offsets: tuple[tuple[int, int], ...]
+
+    @property
+    def end_utc(self) -> datetime:
+        return self.start_utc + timedelta(minutes=self.minutes)
+
+    def _offset(self, m: int) -> int:
+        off = self.offsets[0][1]
+        for since, o in self.offsets:
+            if m < since:
+                break
+            off = o
+        return off
+
+    def minute(self, dt: datetime, ceil: bool = False) -> int:
+        """Minuto del día de un instante (aware) o de una hora de reloj de esta zona (naive)."""
+        if dt.tzinfo is None:
+            wall = (dt.date() - self.day).days * 1440 + dt.hour * 60 + dt.minute
+            return self.wall_to_minute(wall)
+        secs = (dt - self.start_utc).total_seconds()
+        return -int(-secs // 60) if ceil else int(secs // 60)
+
+    def span(self, start: datetime, end: datetime) -> tuple[int, int]:
+        return self.minute(start), self.minute(end, ceil=True)
+
+    def wall_to_minute(self, wall: int) -> int:
+        """
+        Hora de reloj (minutos desde las 00:00) → minuto del día. Una hora que
+        no existe (adelanto) cae en el cambio; una repetida (atraso) toma la primera.
+        """
+        base = self.offsets[0][1]
+        untils = [since for since, _ in self.offsets[1:]] + [None]
+        for (since, off), until in zip(self.offsets, untils):
+            m = wall - self.start_wall - (off - base)
+            if m < since:
+                return since
+            if until is None or m < until:
+                return m
+        return m
+
+    def wall(self, m: int) -> int:
+        """Minuto del día → hora de reloj (minutos desde las 00:00)."""
+        return self.start_wall + m + self._offset(m) - self.offsets[0][1]
+
+    def label(self, m: int) -> str:
+        hh, mm = divmod(self.wall(m) % 1440, 60)
+        return f"{hh:02d}:{mm:02d}"
+
+    def at(self, m: int) -> datetime:
+        """Minuto del día → instante UTC."""
+        return self.start_utc + timedelta(minutes=m)
+
+def _offset_min(dt_utc: datetime, tz: ZoneInfo) -> int:
+    return int(dt_utc.astimezone(tz).utcoffset().total_seconds() // 60)
+
+@lru_cache(maxsize=4096)
+def local_day(tz_name: str, day: date) -> LocalDay:
+    """Arma (una vez por zona y día) la tabla de offsets del día."""
+    tz = zone(tz_name)
+    start_utc, end_utc = local_date_bounds_utc(day, tz_name)
+    minutes = int((end_utc - start_utc).total_seconds() // 60)
+    first = start_utc.astimezone(tz)
+    offsets = [(0, _offset_min(start_utc, tz))]
+
+    # cambios de horario: se buscan hora por hora y se afinan al minuto
+    prev = 0
+    for h in range(60, minutes + 60, 60):
+        m = min(h, minutes - 1)
+        off = _offset_min(start_utc + timedelta(minutes=m), tz)
+        if off != offsets[-1][1]:
+            lo, hi = prev, m
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                if _offset_min(start_utc + timedelta(minutes=mid), tz) == off:
+                    hi = mid
+                else:
+                    lo = mid
+            offsets.append((hi, off))
+        prev = m
+
+    return LocalDay(
+        tz_name=tz_name,
+        day=day,
+        start_utc=start_utc,
+        minutes=minutes,
+        start_wall=first.hour * 60 + first.minute,
+        offsets=tuple(offsets),
+    )
@@ -0,0 +1,35 @@
+# benchmarks/_data.py
+"""Constantes y calendarios sintéticos compartidos por los benchmarks (los fixtures están en conftest.py)."""
+from datetime import date, datetime, time, timedelta
+
+from app.utils.time import local_day
+
+TZ = "America/Asuncion"
+DAY = date(2031, 3, 4)  # martes, lejos de "hoy" para que la grilla no dependa de la hora
+
+
+def booked(day: date, every_min: int, length_min: int, start=time(8, 30), end=time(18, 30)):
+    """Turnos de `length_min` cada `every_min` dentro de la ventana."""
+    cur = datetime.combine(day, start)
+    stop = datetime.combine(day, end)
+    out = []
+    while cur < stop:
+        out.append((cur, cur + timedelta(minutes=length_min)))
+        cur += timedelta(minutes=every_min)
+    return out
+
+
+# nombre -> lista de ocupados (hora de reloj naive en TZ)
+CALENDARS = {
+    "empty": [],
+    "sparse": booked(DAY, every_min=180, length_min=60),
+    "half": booked(DAY, every_min=120, length_min=60),
+    "full": booked(DAY, every_min=60, length_min=60),
+    "fragmented": booked(DAY, every_min=25, length_min=15),
+}
+
+
+def minutes(busy):
+    """Ocupados → minutos del día local, como los arman los endpoints (LocalDay.span)."""
+    ld = local_day(TZ, DAY)
+    return [ld.span(s, e) for s, e in busy]
@@ -0,0 +1,54 @@
+# benchmarks/conftest.py
+"""
+Calendarios sintéticos para los microbenchmarks (sin DB).
+
+    pip install -r requirements-dev.txt
+    python -m pytest benchmarks --benchmark-autosave
+    python -m pytest benchmarks --benchmark-compare --benchmark-compare-fail=mean:15%
+"""
+from datetime import datetime, time
+
+import pytest
+
+from app.candidates import StaffCalendar
+from app.utils.time import local_day, local_to_utc
+from benchmarks._data import CALENDARS, DAY, TZ, booked, minutes
+
+
+@pytest.fixture
+def ld():
+    return local_day(TZ, DAY)
+
+
+@pytest.fixture(params=sorted(CALENDARS))
+def calendar(request):
+    return request.param, minutes(CALENDARS[request.param])
+
+
+@pytest.fixture
+def many_staff():
+    """40 staff, cada uno con un calendario distinto + blackouts al mediodía."""
+    names = sorted(CALENDARS)
+    lunch = (datetime.combine(DAY, time(12, 0)), datetime.combine(DAY, time(13, 0)))
+    return [
+        minutes([*CALENDARS[names[i % len(names)]], *([lunch] if i % 2 else [])])
+        for i in range(40)
+    ]
+
+
+@pytest.fixture
+def many_staff_calendars():
+    """40 staff con los calendarios de arriba (09–13 y 14–18, lunes a sábado) + los turnos a repartir."""
+    names = sorted(CALENDARS)
+    week = [(dow, time(9, 0), time(13, 0)) for dow in range(1, 7)] + \
+           [(dow, time(14, 0), time(18, 0)) for dow in range(1, 7)]
+    cals = {
+        i: StaffCalendar(i, f"Staff {i:02d}", TZ, week,
+                         [("appointment", s, e) for s, e in CALENDARS[names[i % len(names)]]])
+        for i in range(1, 41)
+    }
+    appts = [
+        {"id": n, "starts_at": local_to_utc(s, TZ), "ends_at": local_to_utc(e, TZ)}
+        for n, (s, e) in enumerate(booked(DAY, every_min=60, length_min=45, start=time(9, 0), end=time(18, 0)))
+    ]
+    return cals, appts
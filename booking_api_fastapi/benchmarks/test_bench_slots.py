@@ -0,0 +1,32 @@
+# benchmarks/test_bench_slots.py
+from app.candidates import suggest_assignments
+from app.free_slots import free_runs, grid_slots
+
+DURATION = 60
+
+
+def test_free_runs(benchmark, ld, calendar):
+    _, busy = calendar
+    benchmark(free_runs, ld, busy)
+
+
+def test_grid_slots(benchmark, ld, calendar):
+    """Loop de candidatos de /bookings/available-slots (grilla de 15 min)."""
+    _, busy = calendar
+    runs = free_runs(ld, busy)
+    benchmark(grid_slots, ld, runs, [], DURATION)
+
+
+def test_grid_slots_many_staff(benchmark, ld, many_staff):
+    runs = [free_runs(ld, busy) for busy in many_staff]
+
+    def run():
+        return [grid_slots(ld, r, [], DURATION) for r in runs]
+
+    benchmark(run)
+
+
+def test_suggest_assignments_many_staff(benchmark, many_staff_calendars):
+    """Día completo de un staff enfermo repartido entre otros 40 (/admin/appointments/candidates)."""
+    cals, appts = many_staff_calendars
+    benchmark(suggest_assignments, cals, appts, [0])
@@ -0,0 +1,54 @@
+# benchmarks/test_bench_time.py
+from datetime import datetime, time, timezone
+
+from app.utils.time import (
+    combine_date_time_local, iter_range, local_date_bounds_utc, local_day, local_to_utc, utc_to_local,
+)
+
+from benchmarks._data import DAY, TZ
+
+UTC_INSTANT = datetime(2031, 3, 4, 15, 30, tzinfo=timezone.utc)
+
+
+def test_iter_range_day_5min(benchmark):
+    start = combine_date_time_local(DAY, time(0, 0), TZ)
+    end = combine_date_time_local(DAY, time(23, 59), TZ)
+    benchmark(lambda: sum(1 for _ in iter_range(start, end, 5)))
+
+
+def test_utc_to_local(benchmark):
+    benchmark(utc_to_local, UTC_INSTANT, TZ)
+
+
+def test_local_to_utc(benchmark):
+    benchmark(local_to_utc, datetime(2031, 3, 4, 11, 30), TZ)
+
+
+def test_combine_date_time_local(benchmark):
+    benchmark(combine_date_time_local, DAY, "09:30", TZ)
+
+
+def test_local_date_bounds_utc(benchmark):
+    benchmark(local_date_bounds_utc, DAY, TZ)
+
+
+def test_convert_100_appointments(benchmark):
+    """Lo que hace /availability por staff: convertir cada ocupado a hora local."""
+    instants = [UTC_INSTANT.replace(minute=m % 60, hour=8 + m // 60) for m in range(0, 600, 6)]
+    benchmark(lambda: [utc_to_local(dt, TZ) for dt in instants])
+
+
+def test_local_day_cold(benchmark):
+    """Armar la tabla de offsets de un día (una vez por zona y día; después sale del cache)."""
+    def run():
+        local_day.cache_clear()
+        return local_day(TZ, DAY)
+
+    benchmark(run)
+
+
+def test_span_100_appointments(benchmark):
+    """Lo mismo con la tabla del día: instantes → minutos enteros, sin tzinfo."""
+    ld = local_day(TZ, DAY)
+    instants = [UTC_INSTANT.replace(minute=m % 60, hour=8 + m // 60) for m in range(0, 600, 6)]
+    benchmark(lambda: [ld.span(dt, dt) for dt in instants])
@@ -0,0 +1,56 @@
+-- Tablas tal como están en producción (las consultas de /bookings y /admin usan
+-- customer_name/customer_phone/price, que no están en app/models.py).
+-- Sin constraint EXCLUDE a propósito: el load test mide si la API sola evita solapes.
+-- Sin tenant_id ni índices únicos, como una base de antes del multi-tenant:
+-- antes de levantar la app correr `python -m app.schema` (ver README §8).
+
+CREATE TABLE IF NOT EXISTS services (
+    id               serial PRIMARY KEY,
+    category         text    NOT NULL,
+    name             text    NOT NULL,
+    description      text,
+    price            integer NOT NULL,
+    duration_minutes integer NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS staff (
+    id         serial PRIMARY KEY,
+    full_name  text        NOT NULL,
+    phone      text,
+    active     boolean     NOT NULL DEFAULT true,
+    timezone   text        NOT NULL DEFAULT 'America/Asuncion',
+    created_at timestamptz NOT NULL DEFAULT now(),
+    updated_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS staff_schedules (
+    id            serial PRIMARY KEY,
+    staff_id      integer  NOT NULL REFERENCES staff(id) ON DELETE CASCADE,
+    day_of_week   smallint NOT NULL,
+    start_time    time     NOT NULL,
+    end_time      time     NOT NULL,
+    break_minutes integer  NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS blackouts (
+    id        serial PRIMARY KEY,
+    staff_id  integer     NOT NULL REFERENCES staff(id) ON DELETE CASCADE,
+    reason    text,
+    starts_at timestamptz NOT NULL,
+    ends_at   timestamptz NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS appointments (
+    id             serial PRIMARY KEY,
+    service_id     integer     NOT NULL REFERENCES services(id) ON DELETE RESTRICT,
+    staff_id       integer     NOT NULL REFERENCES staff(id) ON DELETE RESTRICT,
+    customer_name  text        NOT NULL,
+    customer_phone text,
+    starts_at      timestamptz NOT NULL,
+    ends_at        timestamptz NOT NULL,
+    price          integer     NOT NULL DEFAULT 0,
+    status         text        NOT NULL DEFAULT 'confirmed',
+    notes          text
+);
+
+CREATE INDEX IF NOT EXISTS ix_appointments_staff_starts ON appointments (staff_id, starts_at);
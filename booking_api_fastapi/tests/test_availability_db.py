@@ -0,0 +1,114 @@
+# tests/test_availability_db.py
+"""
+/availability/by-staff contra el esquema real (loadtest/schema.sql + `python -m app.schema`).
+
+Necesita Postgres: TEST_DATABASE_URL=postgresql://... Cada corrida usa un schema propio
+que se borra al final; sin la variable el test se saltea.
+"""
+import os
+import uuid
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from starlette.testclient import TestClient
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL no está definido")
+
+SCHEMA_SQL = Path(__file__).resolve().parents[1] / "loadtest" / "schema.sql"
+DAY = "2031-03-04"   # martes (day_of_week 2), fuera del horizonte: tramos en vivo
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    import app.schema
+
+    name = f"test_{uuid.uuid4().hex[:12]}"
+    admin = create_engine(TEST_DATABASE_URL, isolation_level="AUTOCOMMIT")
+    with admin.connect() as conn:
+        conn.execute(text(f"CREATE SCHEMA {name}"))
+    engine = create_engine(TEST_DATABASE_URL, connect_args={"options": f"-csearch_path={name}"})
+    try:
+        with engine.begin() as conn:
+            conn.exec_driver_sql(SCHEMA_SQL.read_text())
+        monkeypatch.setattr(app.schema, "require_engine", lambda: engine)
+        assert app.schema.upgrade_schema() == []
+        yield engine
+    finally:
+        engine.dispose()
+        with admin.connect() as conn:
+            conn.execute(text(f"DROP SCHEMA {name} CASCADE"))
+        admin.dispose()
+
+
+@pytest.fixture
+def client(engine):
+    from app.db import get_db
+    from app.main import app
+
+    Session = sessionmaker(bind=engine)
+
+    def db():
+        session = Session()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[get_db] = db
+    try:
+        yield TestClient(app)   # sin `with`: no corre el lifespan (pool, directorio de tenants)
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+
+
+@pytest.fixture
+def salon(engine):
+    with engine.begin() as conn:
+        service = conn.execute(text("""
+            INSERT INTO services (category, name, price, duration_minutes)
+            VALUES ('Peluquería', 'Corte', 100000, 60) RETURNING id
+        """)).scalar()
+        ana, bea = conn.execute(text("""
+            INSERT INTO staff (full_name, timezone) VALUES
+                ('Ana', 'America/Asuncion'), ('Bea', 'America/Asuncion')
+            RETURNING id
+        """)).scalars().all()
+        conn.execute(text("""
+            INSERT INTO staff_schedules (staff_id, day_of_week, start_time, end_time)
+            SELECT s, 2, t.start_time, t.end_time
+            FROM unnest(CAST(:staff AS integer[])) AS s,
+                 (VALUES (time '09:00', time '13:00'), (time '14:00', time '18:00')) AS t(start_time, end_time)
+        """), {"staff": [ana, bea]})
+        conn.execute(text("""
+            INSERT INTO appointments (service_id, staff_id, customer_name, starts_at, ends_at, status) VALUES
+                (:svc, :ana, 'Confirmada', timestamptz '2031-03-04 10:00-03', timestamptz '2031-03-04 11:00-03', 'confirmed'),
+                (:svc, :bea, 'Cancelada',  timestamptz '2031-03-04 10:00-03', timestamptz '2031-03-04 11:00-03', 'cancelled')
+        """), {"svc": service, "ana": ana, "bea": bea})
+    return service, ana, bea
+
+
+def test_by_staff_matches_available_slots(client, salon):
+    service, ana, bea = salon
+    r = client.get("/availability/by-staff", params={"service_id": service, "day": DAY})
+    assert r.status_code == 200, r.text
+    by_staff = {row["staff_id"]: [s["time_local"] for s in row["slots"]] for row in r.json()}
+    assert set(by_staff) == {ana, bea}
+
+    for sid in (ana, bea):
+        one = client.get("/bookings/available-slots", params={"service_id": service, "staff_id": sid, "date": DAY})
+        assert one.status_code == 200, one.text
+        assert by_staff[sid] == one.json()
+
+    assert "10:00" not in by_staff[ana] and "10:30" not in by_staff[ana]   # turno confirmado
+    assert "10:00" in by_staff[bea]                                         # el cancelado no ocupa
+
+
+def test_by_staff_filters_and_unknown_service(client, salon):
+    service, ana, _ = salon
+    r = client.get("/availability/by-staff", params={"service_id": service, "day": DAY, "staff_id": ana,
+                                                     "fields": "staff_id,staff_name"})
+    assert r.json() == [{"staff_id": ana, "staff_name": "Ana"}]
+    assert client.get("/availability/by-staff", params={"service_id": 999, "day": DAY}).status_code == 404
@@ -0,0 +1,45 @@
+# tests/test_bulk_patch.py
+"""Chequeo de conflictos dentro del lote de PATCH /admin/appointments (sin DB)."""
+from datetime import datetime, timedelta, timezone
+
+from app.routers.admin import _batch_clashes
+
+T10 = datetime(2031, 3, 4, 13, 0, tzinfo=timezone.utc)   # 10:00 en Asunción
+T12 = T10 + timedelta(hours=2)
+HOUR = timedelta(hours=1)
+
+
+def row(appt_id, staff_id, start, status="confirmed"):
+    return {"id": appt_id, "staff_id": staff_id, "status": status, "starts_at": start, "ends_at": start + HOUR}
+
+
+def moved(appt_id, staff_id, start, status="confirmed"):
+    return {"id": appt_id, "staff_id": staff_id, "status": status, "start": start, "end": start + HOUR,
+            "moved": True}
+
+
+def test_failed_item_keeps_its_slot():
+    # A (invalid_start_local) queda confirmado 10:00 en X; B no puede moverse ahí
+    current = {1: row(1, 1, T10), 2: row(2, 1, T12)}
+    final = {2: moved(2, 1, T10)}
+    assert _batch_clashes(final, current, set()) == {2}
+
+
+def test_moves_within_batch_are_compared_with_final_state():
+    # A se va a las 12:00 y B ocupa las 10:00: ninguno choca
+    current = {1: row(1, 1, T10), 2: row(2, 2, T10)}
+    final = {1: moved(1, 1, T12), 2: moved(2, 1, T10)}
+    assert _batch_clashes(final, current, set()) == set()
+
+
+def test_clash_returns_row_to_its_slot():
+    # A quiere ir a las 12:00 pero choca con la DB y se queda a las 10:00; B no puede ocupar las 10:00
+    current = {1: row(1, 1, T10), 2: row(2, 2, T10)}
+    final = {1: moved(1, 1, T12), 2: moved(2, 1, T10)}
+    assert _batch_clashes(final, current, {1}) == {1, 2}
+
+
+def test_cancelled_rows_do_not_block():
+    current = {1: row(1, 1, T10, status="cancelled"), 2: row(2, 1, T12)}
+    final = {2: moved(2, 1, T10)}
+    assert _batch_clashes(final, current, set()) == set()
@@ -0,0 +1,109 @@
+# tests/test_candidates.py
+"""Evaluación y orden de candidatos para reasignar turnos (sin DB)."""
+from datetime import date, datetime, time
+
+from app.candidates import StaffCalendar, evaluate, rank_candidates, suggest_assignments
+from app.utils.time import local_to_utc
+
+TZ = "America/Asuncion"
+DAY = date(2031, 3, 4)   # martes: day_of_week 2
+TUESDAY = [(2, time(9, 0), time(13, 0)), (2, time(14, 0), time(18, 0))]
+
+
+def at(hhmm: str, tz: str = TZ) -> datetime:
+    return local_to_utc(datetime.combine(DAY, time.fromisoformat(hhmm)), tz)
+
+
+def cal(staff_id, name, busy=(), schedules=TUESDAY, tz=TZ):
+    return StaffCalendar(staff_id, name, tz, list(schedules),
+                         [(kind, at(s, tz), at(e, tz)) for kind, s, e in busy])
+
+
+def test_available_with_gaps_to_neighbours():
+    c = cal(1, "Ana", [("appointment", "10:00", "11:00")])
+    out = evaluate(c, at("11:00"), at("12:00"))
+    assert out["available"] and out["reasons"] == []
+    assert out["start_local"] == "11:00"
+    assert (out["gap_before_min"], out["gap_after_min"]) == (0, 60)   # pegado al turno, hasta las 13:00
+    assert out["booked_minutes"] == 60
+
+
+def test_off_schedule():
+    out = evaluate(cal(1, "Ana", schedules=[(1, time(9, 0), time(18, 0))]), at("10:00"), at("11:00"))
+    assert not out["available"]
+    assert out["reasons"] == ["off_schedule"]
+    assert out["gap_before_min"] is None and out["gap_after_min"] is None
+
+
+def test_across_schedule_blocks_is_off_schedule():
+    out = evaluate(cal(1, "Ana"), at("12:30"), at("13:30"))
+    assert out["reasons"] == ["off_schedule"]
+
+
+def test_busy_reasons_are_sorted_and_unique():
+    c = cal(1, "Ana", [("hold", "10:30", "11:00"), ("blackout", "09:30", "10:15"),
+                       ("appointment", "10:15", "10:30"), ("hold", "10:45", "11:30")])
+    out = evaluate(c, at("10:00"), at("11:00"))
+    assert out["reasons"] == ["appointment", "blackout", "hold"]
+
+
+def test_touching_busy_range_does_not_clash():
+    c = cal(1, "Ana", [("appointment", "09:00", "10:00"), ("blackout", "11:00", "12:00")])
+    out = evaluate(c, at("10:00"), at("11:00"))
+    assert out["available"]
+    assert (out["gap_before_min"], out["gap_after_min"]) == (0, 0)
+
+
+def test_evaluates_in_the_candidates_own_zone():
+    # 10:00 en Asunción (-03) son las 08:00 en Nueva York (-05): fuera de su horario de 09:00
+    ny = cal(1, "Ana", tz="America/New_York")
+    out = evaluate(ny, at("10:00"), at("11:00"))
+    assert out["start_local"] == "08:00"
+    assert out["reasons"] == ["off_schedule"]
+    assert evaluate(ny, at("11:00"), at("12:00"))["available"]
+
+
+def test_rank_available_first_then_smallest_gap_then_least_booked():
+    cals = {
+        1: cal(1, "Ana", [("appointment", "09:00", "10:00")]),              # gaps 0 + 120
+        2: cal(2, "Bea", [("appointment", "09:00", "10:00"),
+                          ("appointment", "11:00", "13:00")]),              # gaps 0 + 0
+        3: cal(3, "Caro", [("blackout", "10:00", "11:00")]),                # no disponible
+        4: cal(4, "Dani", [("appointment", "09:00", "10:00"),
+                           ("appointment", "11:00", "12:00"),
+                           ("appointment", "15:00", "17:00")]),             # gaps 0 + 0, más reservado
+        5: cal(5, "Eli"),                                                   # el original: se excluye
+    }
+    ranked = rank_candidates(cals, at("10:00"), at("11:00"), exclude_staff=[5])
+    assert [c["staff_id"] for c in ranked] == [2, 4, 1, 3]
+    assert [c["booked_minutes"] for c in ranked[:2]] == [180, 240]
+
+
+def test_rank_ties_by_name():
+    cals = {1: cal(1, "Zoe"), 2: cal(2, "Ana")}
+    assert [c["staff_name"] for c in rank_candidates(cals, at("10:00"), at("11:00"))] == ["Ana", "Zoe"]
+
+
+def appt(appt_id, start, end):
+    return {"id": appt_id, "starts_at": at(start), "ends_at": at(end)}
+
+
+def test_suggestions_do_not_overlap_each_other():
+    cals = {1: cal(1, "Ana"), 2: cal(2, "Bea", [("appointment", "09:00", "10:00")]), 9: cal(9, "Original")}
+    before = {sid: list(c.busy) for sid, c in cals.items()}
+    appts = [appt(11, "10:30", "11:30"), appt(10, "10:00", "11:00")]   # se recorren por hora de inicio
+    out = suggest_assignments(cals, appts, exclude_staff=[9])
+
+    assert [e["appointment"]["id"] for e in out] == [10, 11]
+    assert out[0]["suggested_staff_id"] == 2          # Bea: sin hueco antes
+    assert out[1]["suggested_staff_id"] == 1          # Bea ya quedó ocupada 10:00–11:00
+    bea = next(c for c in out[1]["candidates"] if c["staff_id"] == 2)
+    assert bea["reasons"] == ["appointment"]
+    assert {sid: c.busy for sid, c in cals.items()} == before   # cals no se modifica
+
+
+def test_no_suggestion_when_nobody_is_free():
+    cals = {1: cal(1, "Ana", [("blackout", "09:00", "13:00")])}
+    out = suggest_assignments(cals, [appt(10, "10:00", "11:00")])
+    assert out[0]["suggested_staff_id"] is None
+    assert out[0]["candidates"][0]["reasons"] == ["blackout"]
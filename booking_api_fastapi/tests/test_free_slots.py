@@ -0,0 +1,100 @@
+# tests/test_free_slots.py
+"""Tramos libres y grilla de horarios en minutos del día local (sin DB)."""
+from datetime import date
+
+import pytest
+
+from app.free_slots import free_runs, grid_slots, work_window
+from app.utils.time import local_day
+
+TZ = "America/Asuncion"
+DAY = date(2031, 3, 4)   # lejos de "hoy": la grilla no depende de la hora
+
+# días con cambio de horario (ver tests/test_time.py)
+DST_DAYS = [
+    ("America/New_York", date(2031, 3, 9)),
+    ("America/New_York", date(2031, 11, 2)),
+    ("Europe/Berlin", date(2031, 3, 30)),
+    ("Europe/Berlin", date(2031, 10, 26)),
+    ("America/Santiago", date(2031, 9, 7)),
+    ("America/Santiago", date(2031, 4, 5)),
+]
+
+
+def hm(s: str) -> int:
+    hh, mm = s.split(":")
+    return int(hh) * 60 + int(mm)
+
+
+def grid(first: str, last: str) -> list[str]:
+    """Horarios cada 15 min de `first` a `last` inclusive."""
+    return [f"{m // 60:02d}:{m % 60:02d}" for m in range(hm(first), hm(last) + 1, 15)]
+
+
+@pytest.fixture
+def ld():
+    return local_day(TZ, DAY)
+
+
+def busy(ld, *ranges):
+    return [(ld.wall_to_minute(hm(s)), ld.wall_to_minute(hm(e))) for s, e in ranges]
+
+
+def test_free_runs_empty_day_runs_to_end_of_day(ld):
+    start, _ = work_window(ld)
+    assert free_runs(ld, []) == [(start, ld.minutes)]
+
+
+def test_free_runs_complement_merges_and_clips(ld):
+    b = busy(ld, ("07:00", "08:00"),     # antes de la ventana: no cuenta
+                 ("08:00", "09:00"),     # pisa el inicio
+                 ("10:30", "12:00"),
+                 ("10:00", "11:00"),     # se solapa con el anterior
+                 ("15:00", "15:30"))
+    assert free_runs(ld, b) == busy(ld, ("09:00", "10:00"), ("12:00", "15:00")) + [
+        (ld.wall_to_minute(hm("15:30")), ld.minutes),
+    ]
+
+
+def test_free_runs_busy_past_end_of_day(ld):
+    b = [(ld.wall_to_minute(hm("17:00")), ld.minutes + 60)]
+    assert free_runs(ld, b) == busy(ld, ("08:30", "17:00"))
+
+
+def test_grid_slots_empty_day(ld):
+    assert grid_slots(ld, free_runs(ld, []), [], 60) == grid("08:30", "18:30")
+
+
+def test_grid_slots_service_must_fit_in_a_run(ld):
+    runs = free_runs(ld, busy(ld, ("10:00", "11:00")))
+    slots = grid_slots(ld, runs, [], 60)
+    assert slots == grid("08:30", "09:00") + grid("11:00", "18:30")
+
+
+def test_grid_slots_skips_holds(ld):
+    runs = free_runs(ld, [])
+    slots = grid_slots(ld, runs, busy(ld, ("14:00", "14:30")), 30)
+    assert "13:30" in slots and "14:30" in slots
+    assert not {"13:45", "14:00", "14:15"} & set(slots)
+
+
+def test_grid_slots_today_starts_at_next_grid_point(ld):
+    now = ld.at(ld.wall_to_minute(hm("10:07")))
+    assert grid_slots(ld, free_runs(ld, []), [], 30, now=now) == grid("10:15", "18:30")
+    # `now` de otro día no recorta nada
+    assert grid_slots(ld, free_runs(ld, []), [], 30, now=ld.start_utc.replace(year=2030)) == grid("08:30", "18:30")
+
+
+@pytest.mark.parametrize("tz_name, day", DST_DAYS, ids=[f"{tz}-{d}" for tz, d in DST_DAYS])
+def test_dst_days_keep_wall_clock_grid(tz_name, day):
+    ld = local_day(tz_name, day)
+    runs = free_runs(ld, [])
+    assert runs[-1][1] == ld.minutes
+    assert grid_slots(ld, runs, [], 60) == grid("08:30", "18:30")
+
+    b = busy(ld, ("12:00", "13:00"))
+    slots = grid_slots(ld, free_runs(ld, b), [], 60)
+    assert slots == grid("08:30", "11:00") + grid("13:00", "18:30")
+    # cada horario ofrecido empieza a esa hora de reloj en la zona del staff
+    for s in slots:
+        assert ld.label(ld.wall_to_minute(hm(s))) == s
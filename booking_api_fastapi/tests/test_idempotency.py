@@ -0,0 +1,71 @@
+# tests/test_idempotency.py
+"""Replay de Idempotency-Key en POST /bookings (sin DB: sesión falsa con la fila guardada)."""
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.routers.bookings import BookingIn, _replay_idempotent, _request_hash
+
+
+class FakeResult:
+    def __init__(self, row):
+        self.row = row
+
+    def mappings(self):
+        return self
+
+    def first(self):
+        return self.row
+
+
+class FakeSession:
+    """Devuelve `saved` para el SELECT de idempotency_keys y anota lo demás."""
+
+    def __init__(self, saved):
+        self.saved = saved
+        self.statements = []
+        self.rolled_back = False
+
+    def execute(self, stmt, params=None):
+        self.statements.append(str(stmt))
+        return FakeResult(self.saved if "FROM idempotency_keys" in str(stmt) else None)
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+def booking(**kw):
+    data = {"service_id": 1, "staff_id": 2, "client_name": "Ana", "starts_at": datetime(2031, 3, 4, 10, 0)}
+    return BookingIn(**{**data, **kw})
+
+
+def test_hash_depends_only_on_payload():
+    assert _request_hash(booking()) == _request_hash(booking())
+    assert _request_hash(booking()) != _request_hash(booking(staff_id=3))
+
+
+def test_new_key_takes_lock_and_returns_none():
+    db = FakeSession(None)
+    assert _replay_idempotent(db, "1:abc", _request_hash(booking())) is None
+    assert "pg_advisory_xact_lock" in db.statements[0]
+    assert not db.rolled_back                   # sigue con la reserva, con el lock tomado
+
+
+def test_same_payload_replays_saved_response():
+    h = _request_hash(booking())
+    db = FakeSession({"request_hash": h, "status_code": 200, "response": {"id": 9}})
+    res = _replay_idempotent(db, "1:abc", h)
+    assert res.status_code == 200
+    assert res.body == b'{"id":9}'
+    assert res.headers["Idempotent-Replayed"] == "true"
+    assert db.rolled_back
+
+
+def test_other_payload_with_same_key_is_422():
+    saved = {"request_hash": _request_hash(booking()), "status_code": 200, "response": {"id": 9}}
+    db = FakeSession(saved)
+    with pytest.raises(HTTPException) as e:
+        _replay_idempotent(db, "1:abc", _request_hash(booking(staff_id=3)))
+    assert e.value.status_code == 422
+    assert db.rolled_back                       # suelta el lock de la key
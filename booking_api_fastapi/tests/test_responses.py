@@ -0,0 +1,119 @@
+# tests/test_responses.py
+"""`fields=` y compresión de respuestas (sin DB)."""
+import pytest
+from fastapi import HTTPException
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app import compression
+from app.compression import CompressionMiddleware
+from app.utils.responses import parse_fields
+
+ALLOWED = ["id", "service_id", "staff_id", "start_utc", "end_utc"]
+
+
+# ---------- parse_fields ----------
+@pytest.mark.parametrize("raw", [None, "", "  "])
+def test_no_fields_means_all(raw):
+    assert parse_fields(raw, ALLOWED) is None
+
+
+def test_fields_follow_allowed_order():
+    assert parse_fields(" end_utc, id ,staff_id", ALLOWED) == ["id", "staff_id", "end_utc"]
+
+
+def test_always_fields_are_added():
+    assert parse_fields("start_utc", ALLOWED, always=["id"]) == ["id", "start_utc"]
+    assert parse_fields("id,start_utc", ALLOWED, always=["id"]) == ["id", "start_utc"]
+
+
+def test_unknown_field_is_400():
+    with pytest.raises(HTTPException) as e:
+        parse_fields("id,nope,client_name", ALLOWED)
+    assert e.value.status_code == 400
+    assert "['client_name', 'nope']" in e.value.detail
+
+
+# ---------- CompressionMiddleware ----------
+BIG = b'{"slots":"' + b"09:00," * 400 + b'"}'
+SMALL = b'{"ok":true}'
+
+
+async def big(request):
+    return Response(BIG, media_type="application/json")
+
+
+async def small(request):
+    return Response(SMALL, media_type="application/json")
+
+
+async def png(request):
+    return Response(b"\x89PNG" + b"\0" * 4000, media_type="image/png")
+
+
+async def already(request):
+    return Response(b"x" * 4000, media_type="text/plain", headers={"Content-Encoding": "identity"})
+
+
+async def stream(request):
+    async def chunks():
+        for _ in range(3):
+            yield BIG
+    return StreamingResponse(chunks(), media_type="application/json")
+
+
+async def text_plain(request):
+    return PlainTextResponse("métrica 1\n" * 500)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)     # gzip aunque brotli esté instalado
+    app = Starlette(routes=[Route("/big", big), Route("/small", small), Route("/png", png),
+                            Route("/already", already), Route("/stream", stream), Route("/text", text_plain)])
+    return TestClient(CompressionMiddleware(app, minimum_size=1024))
+
+
+def test_big_json_is_gzipped(client):
+    r = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert int(r.headers["content-length"]) < len(BIG)
+    assert r.headers["vary"] == "Accept-Encoding"
+    assert r.content == BIG                    # httpx descomprime
+
+
+def test_text_is_compressed(client):
+    r = client.get("/text", headers={"Accept-Encoding": "br;q=1, gzip;q=0.8"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.text == "métrica 1\n" * 500
+
+
+def test_without_accept_encoding_passes_through(client):
+    r = client.get("/big", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in r.headers
+    assert "vary" not in r.headers
+    assert r.content == BIG
+
+
+@pytest.mark.parametrize("path", ["/small", "/png", "/already"])
+def test_small_binary_or_encoded_pass_through(client, path):
+    r = client.get(path, headers={"Accept-Encoding": "gzip"})
+    assert r.headers.get("content-encoding") in (None, "identity")
+    assert int(r.headers["content-length"]) == len(r.content)
+
+
+def test_minimum_size_is_configurable(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    app = CompressionMiddleware(Starlette(routes=[Route("/small", small)]), minimum_size=1)
+    r = TestClient(app).get("/small", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.content == SMALL
+
+
+def test_streaming_is_compressed_on_the_fly(client):
+    r = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert "content-length" not in r.headers
+    assert r.content == BIG * 3
@@ -0,0 +1,204 @@
+# tests/test_tenancy.py
+"""Caches por tenant, invalidación al commit y resolución del salón (sin DB)."""
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app import tenancy
+from app.tenancy import ENTRY_OVERHEAD, Tenant, TenantCache, TenantDirectory, TenantMiddleware, current_tenant
+
+CENTRO = Tenant(2, "centro", "Peluquería Centro")
+NORTE = Tenant(3, "norte", "Peluquería Norte")
+
+
+def value(n: int) -> bytes:
+    """Valor que ocupa `n` bytes en la cuenta del cache."""
+    return b"x" * (n - ENTRY_OVERHEAD)
+
+
+# ---------- TenantCache ----------
+def test_cache_is_per_tenant():
+    cache = TenantCache("t", ttl=60)
+    cache.put(2, "k", b"centro")
+    cache.put(3, "k", b"norte")
+    assert cache.get(2, "k") == b"centro"
+    assert cache.get(3, "k") == b"norte"
+    assert cache.get(4, "k") is None
+
+
+def test_cache_off_with_zero_ttl():
+    cache = TenantCache("t", ttl=0)
+    cache.put(2, "k", b"v")
+    assert cache.get(2, "k") is None
+
+
+def test_cache_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(tenancy.time, "monotonic", lambda: now[0])
+    cache = TenantCache("t", ttl=5)
+    cache.put(2, "k", b"v")
+    now[0] += 4.9
+    assert cache.get(2, "k") == b"v"
+    now[0] += 0.2
+    assert cache.get(2, "k") is None
+    assert cache._total == 0
+
+
+def test_tenant_cap_evicts_that_tenants_lru_only():
+    cache = TenantCache("t", ttl=60, tenant_max_bytes=1000, max_bytes=10_000)
+    cache.put(3, "other", value(400))
+    cache.put(2, "a", value(400))
+    cache.put(2, "b", value(400))
+    assert cache.get(2, "a")                      # "a" pasa a ser el más reciente
+    cache.put(2, "c", value(400))                 # 1200 > 1000: sale "b"
+    assert cache.get(2, "b") is None
+    assert cache.get(2, "a") and cache.get(2, "c")
+    assert cache.get(3, "other")                  # el otro salón no pierde nada
+    assert cache._sizes == {2: 800, 3: 400}
+
+
+def test_total_cap_evicts_least_recent_tenant():
+    cache = TenantCache("t", ttl=60, tenant_max_bytes=1000, max_bytes=1000)
+    cache.put(2, "a", value(400))
+    cache.put(3, "a", value(400))
+    cache.put(4, "a", value(400))                 # 1200 > 1000: sale el del tenant 2
+    assert cache.get(2, "a") is None
+    assert cache.get(3, "a") and cache.get(4, "a")
+    assert cache._total == 800
+
+
+def test_value_bigger_than_tenant_cap_is_not_stored():
+    cache = TenantCache("t", ttl=60, tenant_max_bytes=1000)
+    cache.put(2, "big", value(1001))
+    assert cache.get(2, "big") is None
+    assert cache._total == 0
+
+
+def test_replacing_a_key_keeps_sizes_right():
+    cache = TenantCache("t", ttl=60)
+    cache.put(2, "k", value(400))
+    cache.put(2, "k", value(300))
+    assert cache._sizes[2] == cache._total == 300
+
+
+def test_invalidate_by_key():
+    cache = TenantCache("t", ttl=60)
+    for sid in (1, 2):
+        cache.put(2, (sid, "2031-03-04", 10), b"slots")
+    cache.put(3, (1, "2031-03-04", 10), b"slots")
+    cache.invalidate(2, lambda key: key[0] == 1)
+    assert cache.get(2, (1, "2031-03-04", 10)) is None
+    assert cache.get(2, (2, "2031-03-04", 10)) == b"slots"
+    assert cache.get(3, (1, "2031-03-04", 10)) == b"slots"
+
+
+# ---------- invalidación al commit ----------
+@pytest.fixture
+def availability_cache(monkeypatch):
+    cache = TenantCache("availability", ttl=60)
+    monkeypatch.setattr(tenancy, "availability_cache", cache)
+    cache.put(1, (7, "2031-03-04", 10), b"slots")
+    cache.put(1, (8, "2031-03-04", 10), b"slots")
+    return cache
+
+
+@pytest.fixture
+def db():
+    # sqlite en memoria: sólo hace falta una transacción real para los eventos de commit/rollback
+    with Session(create_engine("sqlite://")) as session:
+        session.execute(text("SELECT 1"))
+        yield session
+
+
+def test_invalidation_waits_for_commit(availability_cache, db):
+    tenancy.invalidate_availability(db, [7])
+    assert availability_cache.get(1, (7, "2031-03-04", 10)) == b"slots"
+    db.commit()
+    assert availability_cache.get(1, (7, "2031-03-04", 10)) is None
+    assert availability_cache.get(1, (8, "2031-03-04", 10)) == b"slots"
+
+
+def test_rollback_discards_invalidation(availability_cache, db):
+    tenancy.invalidate_availability(db, [7])
+    db.rollback()
+    db.execute(text("SELECT 1"))
+    db.commit()
+    assert availability_cache.get(1, (7, "2031-03-04", 10)) == b"slots"
+
+
+# ---------- TenantMiddleware ----------
+async def whoami(request):
+    t = current_tenant()
+    return JSONResponse({"id": t.id, "slug": t.slug})
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(tenancy, "MULTI_TENANT", True)
+    monkeypatch.setattr(tenancy, "TENANT_BASE_DOMAIN", "reservas.example.com")
+    directory = TenantDirectory()
+    directory._by_slug = {t.slug: t for t in (CENTRO, NORTE)}
+    directory._loaded_at = time.monotonic()
+    monkeypatch.setattr(tenancy, "directory", directory)
+    app = Starlette(routes=[Route("/whoami", whoami), Route("/healthz", whoami)])
+    return TestClient(TenantMiddleware(app))
+
+
+def test_tenant_from_header(client):
+    assert client.get("/whoami", headers={"X-Tenant": " Centro "}).json() == {"id": 2, "slug": "centro"}
+
+
+def test_tenant_from_subdomain(client):
+    r = client.get("/whoami", headers={"Host": "norte.reservas.example.com:443"})
+    assert r.json() == {"id": 3, "slug": "norte"}
+
+
+def test_header_wins_over_subdomain(client):
+    r = client.get("/whoami", headers={"Host": "norte.reservas.example.com", "X-Tenant": "centro"})
+    assert r.json()["slug"] == "centro"
+
+
+@pytest.mark.parametrize("headers", [
+    {},
+    {"X-Tenant": ""},
+    {"Host": "reservas.example.com"},
+    {"Host": "a.norte.reservas.example.com"},   # sólo un nivel de subdominio
+    {"Host": "norte.otro-dominio.com"},
+])
+def test_missing_tenant_is_400(client, headers):
+    r = client.get("/whoami", headers=headers)
+    assert r.status_code == 400
+
+
+def test_unknown_tenant_is_404(client):
+    r = client.get("/whoami", headers={"X-Tenant": "sur"})
+    assert r.status_code == 404
+
+
+def test_directory_unavailable_is_503(client, monkeypatch):
+    tenancy.directory._loaded_at = float("-inf")           # vencido: se intenta recargar
+
+    def fail():
+        raise RuntimeError("sin DB")
+    monkeypatch.setattr(tenancy.directory, "reload", fail)
+    assert client.get("/whoami", headers={"X-Tenant": "centro"}).status_code == 503
+
+
+def test_public_paths_need_no_tenant(client):
+    assert client.get("/healthz").json()["slug"] == "default"
+
+
+def test_single_tenant_mode_uses_default(client, monkeypatch):
+    monkeypatch.setattr(tenancy, "MULTI_TENANT", False)
+    assert client.get("/whoami", headers={"X-Tenant": "centro"}).json()["slug"] == "default"
+
+
+def test_tenant_is_reset_after_request(client):
+    client.get("/whoami", headers={"X-Tenant": "centro"})
+    assert current_tenant().slug == "default"
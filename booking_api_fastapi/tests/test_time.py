@@ -0,0 +1,78 @@
+# tests/test_time.py
+"""LocalDay contra zoneinfo en días con cambio de horario (sin DB)."""
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from app.utils.time import local_day, zone
+
+# (zona, día, minutos del día): adelanto (23 h) y atraso (25 h) en tres zonas
+DST_DAYS = [
+    ("America/New_York", date(2031, 3, 9), 1380),     # 02:00 → 03:00
+    ("America/New_York", date(2031, 11, 2), 1500),    # 02:00 → 01:00
+    ("Europe/Berlin", date(2031, 3, 30), 1380),       # 02:00 → 03:00
+    ("Europe/Berlin", date(2031, 10, 26), 1500),      # 03:00 → 02:00
+    ("America/Santiago", date(2031, 9, 7), 1380),     # 00:00 → 01:00: la medianoche no existe
+    ("America/Santiago", date(2031, 4, 5), 1500),     # 24:00 → 23:00: se repite la última hora
+    ("America/Asuncion", date(2031, 3, 4), 1440),     # día normal
+]
+IDS = [f"{tz}-{day}" for tz, day, _ in DST_DAYS]
+
+
+def zoneinfo_walls(ld):
+    """Hora de reloj (minutos desde las 00:00 del día) de cada minuto del día, según zoneinfo."""
+    tz = zone(ld.tz_name)
+    out = []
+    for m in range(ld.minutes):
+        local = (ld.start_utc + timedelta(minutes=m)).astimezone(tz)
+        out.append((local.date() - ld.day).days * 1440 + local.hour * 60 + local.minute)
+    return out
+
+
+@pytest.mark.parametrize("tz_name, day, minutes", DST_DAYS, ids=IDS)
+def test_day_length_and_bounds(tz_name, day, minutes):
+    ld = local_day(tz_name, day)
+    tz = zone(tz_name)
+    assert ld.minutes == minutes
+    assert ld.start_utc.astimezone(tz).date() == day
+    assert ld.end_utc.astimezone(tz).date() == day + timedelta(days=1)
+    assert (ld.end_utc - timedelta(minutes=1)).astimezone(tz).date() == day
+
+
+@pytest.mark.parametrize("tz_name, day, minutes", DST_DAYS, ids=IDS)
+def test_at_and_label_match_zoneinfo(tz_name, day, minutes):
+    ld = local_day(tz_name, day)
+    tz = zone(tz_name)
+    for m in range(ld.minutes):
+        instant = ld.at(m)
+        assert instant == ld.start_utc + timedelta(minutes=m)
+        assert ld.label(m) == instant.astimezone(tz).strftime("%H:%M"), m
+        assert ld.minute(instant) == m
+
+
+@pytest.mark.parametrize("tz_name, day, minutes", DST_DAYS, ids=IDS)
+def test_wall_to_minute_matches_zoneinfo(tz_name, day, minutes):
+    # hora existente → su primer minuto (en el atraso, la primera vez);
+    # hora que no existe (adelanto) → el minuto del cambio
+    ld = local_day(tz_name, day)
+    walls = zoneinfo_walls(ld)
+    for w in range(1440):
+        expected = next(m for m, wall in enumerate(walls) if wall >= w)
+        assert ld.wall_to_minute(w) == expected, w
+        naive = datetime.combine(day, datetime.min.time()) + timedelta(minutes=w)
+        assert ld.minute(naive) == expected, w
+
+
+@pytest.mark.parametrize("tz_name, day, minutes", DST_DAYS, ids=IDS)
+def test_existing_wall_times_round_trip(tz_name, day, minutes):
+    ld = local_day(tz_name, day)
+    tz = zone(tz_name)
+    for w in range(0, 1440, 5):
+        naive = datetime.combine(day, datetime.min.time()) + timedelta(minutes=w)
+        aware = naive.replace(tzinfo=tz)
+        if aware.astimezone(timezone.utc).astimezone(tz).replace(tzinfo=None) != naive:   # no existe (adelanto)
+            continue
+        m = ld.wall_to_minute(w)
+        assert ld.wall(m) == w
+        # misma zona: la comparación ignora fold, por eso se pasa a UTC; si se repite, la primera
+        assert ld.at(m) == min(aware.astimezone(timezone.utc), aware.replace(fold=1).astimezone(timezone.utc))